@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from app.core.database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from app.core.database import get_db, listing_read_preference, pool_metrics
 from app.models.project import Project, ProjectCreate, ProjectRead
-from app.core.security import verify_admin
-from app.core.config import settings
+from app.schemas.models import FileListResponse
+from app.core.security import verify_admin, invalidate_project, project_cache
+from app.api.routes import bucket_cache, dispatch_jobs, invalidate_bucket
+from app.services.images import variant_cache
+import logging
 import secrets
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(dependencies=[Depends(verify_admin)])
 
@@ -24,82 +30,51 @@ async def create_project(project: ProjectCreate, db = Depends(get_db)):
     )
     
     try:
-        dump = new_project.model_dump(by_alias=True, exclude={"id"})
-        print(f"DEBUG: Inserting project: {dump}")
+        # Counters start at zero, so the startup baseline never has to fill them in
+        dump = {**new_project.model_dump(by_alias=True, exclude={"id"}), "bucket_count": 0, "file_count": 0, "total_size": 0}
         result = await db.projects.insert_one(dump)
-        print(f"DEBUG: Inserted ID: {result.inserted_id}")
+        # Never log the dump: it carries the API key
+        logger.debug("Created project %s (%s)", project.name, result.inserted_id)
         created_project = await db.projects.find_one({"_id": result.inserted_id})
         return created_project
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to create project %s", project.name)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/projects", response_model=list[ProjectRead])
 async def list_projects(db = Depends(get_db)):
-    """Optimized project listing using aggregation pipeline"""
-    
-    # Single aggregation pipeline to get all data at once
-    pipeline = [
-        # Lookup buckets
-        {
-            "$lookup": {
-                "from": "buckets",
-                "let": {"project_id": {"$toString": "$_id"}},
-                "pipeline": [
-                    {"$match": {"$expr": {"$eq": ["$project_id", "$$project_id"]}}}
-                ],
-                "as": "buckets"
-            }
-        },
-        # Lookup files
-        {
-            "$lookup": {
-                "from": "files",
-                "let": {"project_id": {"$toString": "$_id"}},
-                "pipeline": [
-                    {"$match": {"$expr": {"$eq": ["$project_id", "$$project_id"]}}},
-                    {
-                        "$group": {
-                            "_id": None,
-                            "count": {"$sum": 1},
-                            "total_size": {"$sum": "$size"}
-                        }
-                    }
-                ],
-                "as": "file_stats"
-            }
-        },
-        # Project final shape
-        {
-            "$project": {
-                "_id": 1,
-                "name": 1,
-                "api_key": 1,
-                "created_at": 1,
-                "bucket_count": {"$size": "$buckets"},
-                "file_count": {
-                    "$ifNull": [{"$arrayElemAt": ["$file_stats.count", 0]}, 0]
-                },
-                "total_size": {
-                    "$ifNull": [{"$arrayElemAt": ["$file_stats.total_size", 0]}, 0]
-                }
-            }
-        }
-    ]
-    
-    projects = await db.projects.aggregate(pipeline).to_list(1000)
+    """Project listing from the usage counters materialized on each project"""
+    # Projects being deleted are no longer listed
+    projects = await db.projects.with_options(read_preference=listing_read_preference()).find(
+        {"deleted_at": None},
+        {"name": 1, "api_key": 1, "created_at": 1, "bucket_count": 1, "file_count": 1, "total_size": 1}
+    ).to_list(1000)
     return projects
 
-@router.delete("/projects/{project_id}")
+@router.post("/usage/repair", status_code=202)
+async def repair_project_usage(
+    background_tasks: BackgroundTasks,
+    project_id: Optional[str] = None,
+    db = Depends(get_db)
+):
+    """Recompute bucket/file counts and total size from the collections (all projects by default)"""
+    from app.services.usage import repair_usage
+    background_tasks.add_task(repair_usage, db, project_id)
+    return {"status": "repairing", "project_id": project_id}
+
+@router.delete("/projects/{project_id}", status_code=202)
 async def delete_project(
     project_id: str,
+    background_tasks: BackgroundTasks,
     db = Depends(get_db)
 ):
-    """Delete a project and ALL associated data (buckets, files, MinIO buckets)"""
-    from app.services.storage import storage_service
+    """Tombstone a project and delete ALL associated data (buckets, files, MinIO buckets) in a background job.
+
+    Calling this again for a project that is already being deleted re-queues
+    the job, which resumes where the previous run stopped.
+    """
     from bson import ObjectId
+    from datetime import datetime
     
     # Find project
     try:
@@ -111,38 +86,51 @@ async def delete_project(
         raise HTTPException(status_code=404, detail="Project not found")
     
     project = Project(**project_data)
-    
-    # Get all buckets for this project
-    buckets = await db.buckets.find({"project_id": project_id}).to_list(1000)
-    
-    # Delete all MinIO buckets and their contents
-    for bucket_data in buckets:
-        physical_name = bucket_data["physical_name"]
-        try:
-            # List and delete all objects in the bucket
-            objects = storage_service.client.list_objects(physical_name, recursive=True)
-            for obj in objects:
-                storage_service.client.remove_object(physical_name, obj.object_name)
-            
-            # Delete the bucket itself
-            storage_service.client.remove_bucket(physical_name)
-        except Exception as e:
-            print(f"Warning: Failed to delete MinIO bucket {physical_name}: {str(e)}")
-    
-    # Delete all files metadata from DB
-    await db.files.delete_many({"project_id": project_id})
-    
-    # Delete all buckets from DB
-    await db.buckets.delete_many({"project_id": project_id})
-    
-    # Delete the project itself
-    await db.projects.delete_one({"_id": ObjectId(project_id)})
+
+    # Stop serving the project right away; the purge runs in the worker
+    if project.deleted_at is None:
+        await db.projects.update_one(
+            {"_id": ObjectId(project_id), "deleted_at": None},
+            {"$set": {
+                "deleted_at": datetime.utcnow(),
+                "deletion": {"status": "queued", "buckets_done": 0, "objects_deleted": 0, "error": None}
+            }}
+        )
+    invalidate_project(project_id)
+    invalidate_bucket(project_id)
+
+    await dispatch_jobs(db, background_tasks, [("delete_project", {"project_id": project_id})])
     
     return {
-        "status": "deleted",
+        "status": "deleting",
         "project_id": project_id,
         "project_name": project.name,
-        "buckets_deleted": len(buckets)
+        "status_url": f"/admin/projects/{project_id}/deletion"
+    }
+
+@router.get("/projects/{project_id}/deletion")
+async def get_deletion_status(
+    project_id: str,
+    db = Depends(get_db)
+):
+    """Progress of a project deletion job"""
+    from bson import ObjectId
+
+    try:
+        project_data = await db.projects.find_one({"_id": ObjectId(project_id)}, {"deleted_at": 1, "deletion": 1})
+    except:
+        raise HTTPException(status_code=400, detail="Invalid project ID")
+
+    # The project document is removed last, once everything else is gone
+    if not project_data:
+        return {"project_id": project_id, "status": "deleted"}
+    if not project_data.get("deleted_at"):
+        raise HTTPException(status_code=404, detail="Project is not being deleted")
+
+    return {
+        "project_id": project_id,
+        "deleted_at": project_data["deleted_at"],
+        **project_data.get("deletion", {})
     }
 
 @router.put("/projects/{project_id}/regenerate-key")
@@ -159,7 +147,7 @@ async def regenerate_api_key(
     except:
         raise HTTPException(status_code=400, detail="Invalid project ID")
     
-    if not project_data:
+    if not project_data or project_data.get("deleted_at"):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Generate new API key
@@ -170,6 +158,7 @@ async def regenerate_api_key(
         {"_id": ObjectId(project_id)},
         {"$set": {"api_key": new_api_key}}
     )
+    invalidate_project(project_id)
     
     return {
         "status": "regenerated",
@@ -177,15 +166,42 @@ async def regenerate_api_key(
         "new_api_key": new_api_key
     }
 
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the in-process caches of this worker"""
+    return {
+        "projects": project_cache.stats(),
+        "buckets": bucket_cache.stats(),
+        "image_variants": variant_cache.stats()
+    }
+
+@router.get("/db/pool")
+async def db_pool_stats():
+    """MongoDB connection pool counters of this worker: checkouts, waits and timeouts"""
+    return pool_metrics.snapshot()
+
+@router.post("/uploads/cleanup")
+async def cleanup_stale_uploads(db = Depends(get_db)):
+    """Abort incomplete multipart uploads older than MULTIPART_STALE_AFTER"""
+    from app.services.janitor import abort_stale_uploads
+    return await abort_stale_uploads(db)
+
 @router.post("/projects/{project_id}/sync")
 async def sync_project(
     project_id: str,
+    prefix: Optional[str] = None,
+    full: bool = False,
     db = Depends(get_db)
 ):
-    """Sync MongoDB state with actual MinIO storage"""
+    """Sync MongoDB state with actual MinIO storage.
+
+    Only keys under `prefix` are compared when given. An interrupted sync
+    resumes from each bucket's checkpoint unless `full` is set.
+    """
     from app.services.storage import storage_service
+    from app.services.sync import sync_bucket
+    from app.services.usage import repair_usage
     from bson import ObjectId
-    from app.models.file import File
     
     # Find project
     try:
@@ -193,7 +209,7 @@ async def sync_project(
     except:
         raise HTTPException(status_code=400, detail="Invalid project ID")
     
-    if not project_data:
+    if not project_data or project_data.get("deleted_at"):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Get all buckets
@@ -212,86 +228,54 @@ async def sync_project(
         
         try:
             # Check if bucket exists in MinIO
-            # Check if bucket exists in MinIO
-            if not storage_service.client.bucket_exists(bucket_name=physical_name):
-                print(f"WARNING: Bucket {physical_name} missing in MinIO. Deleting from DB...")
+            if not await storage_service.bucket_exists(bucket_name=physical_name):
+                logger.warning("Bucket %s missing in MinIO; deleting it from the database", physical_name)
                 await db.buckets.delete_one({"_id": bucket["_id"]})
+                invalidate_bucket(project_id, bucket_name)
                 await db.files.delete_many({"bucket_name": bucket_name, "project_id": project_id})
+                await db.blobs.delete_many({"bucket_name": bucket_name, "project_id": project_id})
                 stats.setdefault("buckets_deleted", 0)
                 stats["buckets_deleted"] += 1
                 continue
             
-            # Get all objects from MinIO
-            minio_objects = storage_service.client.list_objects(bucket_name=physical_name, recursive=True)
-            
-            # Filter out generated files (sanitized, optimized, transcoded)
-            minio_map = {}
-            for obj in minio_objects:
-                is_generated = any(obj.object_name.endswith(suffix) for suffix in [
-                    "_sanitized.pdf", 
-                    "_optimized.webp", 
-                    "_transcoded.mp4"
-                ])
-                if not is_generated:
-                    minio_map[obj.object_name] = obj
-            
-            # Get all files from DB
-            db_files = await db.files.find({
-                "project_id": project_id,
-                "bucket_name": bucket_name
-            }).to_list(10000)
-            db_map = {f["object_key"]: f for f in db_files}
-            
-            # 1. Check for missing files (in MinIO but not DB)
-            for obj_key, obj in minio_map.items():
-                if obj_key not in db_map:
-                    # Add to DB
-                    new_file = File(
-                        project_id=project_id,
-                        bucket_name=bucket_name,
-                        object_key=obj_key,
-                        size=obj.size,
-                        content_type="application/octet-stream" # Default, can't easily guess without head
-                    )
-                    await db.files.insert_one(new_file.model_dump(by_alias=True, exclude={"id"}))
-                    stats["added"] += 1
-                else:
-                    # Check if size matches
-                    db_file = db_map[obj_key]
-                    if db_file["size"] != obj.size:
-                        await db.files.update_one(
-                            {"_id": db_file["_id"]},
-                            {"$set": {"size": obj.size}}
-                        )
-                        stats["updated"] += 1
+            # Buckets created before notifications were configured start sending events now
+            await storage_service.enable_notifications(physical_name)
 
-            # 2. Check for orphaned files (in DB but not MinIO)
-            for obj_key, db_file in db_map.items():
-                if obj_key not in minio_map:
-                    await db.files.delete_one({"_id": db_file["_id"]})
-                    stats["removed"] += 1
+            bucket_stats = await sync_bucket(db, project_id, bucket, prefix=prefix, resume=not full)
+            for key, count in bucket_stats.items():
+                stats[key] += count
                     
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"ERROR syncing bucket {bucket_name}: {str(e)}")
+            logger.exception("Failed to sync bucket %s", bucket_name)
             stats["errors"].append(f"Bucket {bucket_name}: {str(e)}")
+
+    # Sync rewrites files wholesale; recount rather than tracking each change
+    await repair_usage(db, project_id)
             
     return {
         "status": "synced",
         "stats": stats
     }
 
-from app.models.file import File
-
-@router.get("/projects/{project_id}/files", response_model=list[File])
+@router.get("/projects/{project_id}/files", response_model=FileListResponse)
 async def list_project_files(
     project_id: str,
-    db = Depends(get_db),
-    admin_secret: str = Header(..., alias="X-Admin-Secret")
+    bucket: Optional[str] = None,
+    status: Optional[str] = None,
+    content_type: Optional[str] = None,
+    prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db = Depends(get_db)
 ):
-    if admin_secret != settings.ADMIN_SECRET:
-        raise HTTPException(status_code=401, detail="Invalid admin secret")
+    """Page through a project's files, newest first"""
+    from app.services.listing import list_files
 
-    files = await db.files.find({"project_id": project_id}).sort("created_at", -1).to_list(length=100)
-    return files
+    try:
+        items, next_cursor = await list_files(
+            db, project_id, bucket=bucket, status=status, content_type=content_type,
+            prefix=prefix, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileListResponse(items=items, next_cursor=next_cursor)
@@ -1,12 +1,17 @@
 import asyncio
+import logging
 
 from fastapi import APIRouter, Depends, HTTPException
 from app.core.database import get_db
 from app.models.project import Project, Bucket, BucketCreate, BucketRead
 from app.core.security import get_current_project
 from app.services.storage import storage_service
+from app.api.routes import invalidate_bucket
+from app.services.usage import add_usage
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post("/buckets", response_model=BucketRead)
@@ -25,23 +30,7 @@ async def create_bucket(
 
     # Create Bucket in MinIO
     try:
-        if not storage_service.client.bucket_exists(bucket_name=physical_name):
-             storage_service.client.make_bucket(bucket_name=physical_name)
-             
-             # Set public-read policy for permanent access
-             import json
-             policy = {
-                 "Version": "2012-10-17",
-                 "Statement": [
-                     {
-                         "Effect": "Allow",
-                         "Principal": {"AWS": "*"},
-                         "Action": ["s3:GetObject"],
-                         "Resource": [f"arn:aws:s3:::{physical_name}/*"]
-                     }
-                 ]
-             }
-             storage_service.client.set_bucket_policy(bucket_name=physical_name, policy=json.dumps(policy))
+        await storage_service.create_public_bucket(physical_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create bucket in storage: {str(e)}")
 
@@ -49,10 +38,12 @@ async def create_bucket(
     new_bucket = Bucket(
         name=bucket.name,
         physical_name=physical_name,
-        project_id=str(project.id)
+        project_id=str(project.id),
+        image_variants=bucket.image_variants
     )
     
     result = await db.buckets.insert_one(new_bucket.model_dump(by_alias=True, exclude={"id"}))
+    await add_usage(db, str(project.id), buckets=1)
     created_bucket = await db.buckets.find_one({"_id": result.inserted_id})
     
     return created_bucket
@@ -80,7 +71,7 @@ async def delete_bucket(
 
     # Try to remove from MinIO (will fail if not empty)
     try:
-        storage_service.client.remove_bucket(bucket_name=db_bucket.physical_name)
+        await storage_service.remove_bucket(bucket_name=db_bucket.physical_name)
     except Exception as e:
         # Check if error is "BucketNotEmpty"
         if "BucketNotEmpty" in str(e):
@@ -89,6 +80,8 @@ async def delete_bucket(
 
     # Remove from DB
     await db.buckets.delete_one({"_id": bucket_data["_id"]})
+    await add_usage(db, str(project.id), buckets=-1)
+    invalidate_bucket(str(project.id), name)
     return {"status": "deleted", "name": name}
 
 @router.delete("/bucket_delete_root/{name}")
@@ -96,10 +89,10 @@ async def delete_a_bucket(
         name: str
 ):
     try:
-        storage_service.client.remove_bucket(bucket_name=name)
+        await storage_service.remove_bucket(bucket_name=name)
     except Exception as e:
         if "BucketNotEmpty" in str(e):
-            print(f"Bucket is not empty. Please delete all files first.")
+            logger.info("Bucket %s is not empty; its files must be deleted first", name)
     return {"status": "deleted", "name": name}
 
 
@@ -122,11 +115,16 @@ async def update_bucket(
         if existing:
             raise HTTPException(status_code=400, detail="Bucket name already exists")
 
-    # Update logical name only
+    # Update logical name (and image variants when given) only
+    update = {"name": bucket_update.name}
+    if bucket_update.image_variants is not None:
+        update["image_variants"] = [variant.model_dump() for variant in bucket_update.image_variants]
     await db.buckets.update_one(
         {"_id": bucket_data["_id"]},
-        {"$set": {"name": bucket_update.name}}
+        {"$set": update}
     )
+    invalidate_bucket(str(project.id), name)
+    invalidate_bucket(str(project.id), bucket_update.name)
     
     updated_bucket = await db.buckets.find_one({"_id": bucket_data["_id"]})
     return updated_bucket
@@ -0,0 +1,30 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.events import parse_records
+
+router = APIRouter()
+
+
+def verify_webhook_token(authorization: Optional[str] = Header(None)):
+    # MinIO sends its notify_webhook auth_token as "Bearer <token>"
+    token = (authorization or "").removeprefix("Bearer ").strip()
+    if not settings.MINIO_WEBHOOK_TOKEN or not secrets.compare_digest(token, settings.MINIO_WEBHOOK_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+
+@router.post("/events/minio", status_code=204, dependencies=[Depends(verify_webhook_token)])
+async def receive_minio_events(request: Request, db = Depends(get_db)):
+    """MinIO bucket notification webhook; events are recorded and applied in batches"""
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    events = parse_records(payload)
+    if events:
+        await db.object_events.insert_many(events, ordered=False)
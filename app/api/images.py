@@ -0,0 +1,147 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from minio.error import S3Error
+from PIL import UnidentifiedImageError
+
+from app.api.routes import find_file, get_or_create_bucket
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import get_current_project
+from app.models.project import Project, Bucket
+from app.services.images import CONTENT_TYPES, render_resized_file, run_in_pool, variant_cache, variant_key
+from app.services.storage import storage_service
+from app.services.usage import add_usage
+
+router = APIRouter(dependencies=[Depends(get_current_project)])
+
+# Renders in progress; concurrent misses on the same variant await one render
+_renders: dict = {}
+
+
+async def _count_rendition(db, project_id: str, bucket_name: str, object_key: str, size: int):
+    """Add a stored rendition to `derived_size` and the usage counters, as the worker does for its variants"""
+    source = await db.files.find_one(
+        {"project_id": project_id, "bucket_name": bucket_name, "object_key": object_key, "source_file_id": None},
+        {"_id": 1}
+    )
+    if not source:
+        # Not recorded (yet); repair_usage can only count what files reference
+        return
+    # Duplicates mirror the derived_size of the file they share content with
+    result = await db.files.update_many(
+        {"$or": [{"_id": source["_id"]}, {"source_file_id": str(source["_id"])}]},
+        {"$inc": {"derived_size": size}}
+    )
+    await add_usage(db, project_id, size=size * result.modified_count)
+
+
+async def _load_variant(db, project_id: str, bucket_name: str, physical_name: str, object_key: str, derived_key: str,
+                        width: Optional[int], height: Optional[int], fmt: str, quality: int) -> tuple[bytes, str]:
+    # Rendered before, possibly by another API process
+    try:
+        return await storage_service.get_object_bytes(physical_name, derived_key)
+    except S3Error as e:
+        if e.code != "NoSuchKey":
+            raise
+
+    tmp_dir = tempfile.mkdtemp(prefix="resize-")
+    input_path = os.path.join(tmp_dir, "input")
+    output_path = os.path.join(tmp_dir, "output")
+    try:
+        try:
+            await storage_service.download_file(physical_name, object_key, input_path)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise HTTPException(status_code=404, detail="File not found")
+            raise
+
+        try:
+            await asyncio.to_thread(
+                run_in_pool, render_resized_file, input_path, output_path, width, height, fmt, quality
+            )
+        except (UnidentifiedImageError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Cannot resize file: {str(e)}")
+
+        etag = await storage_service.upload_file(physical_name, derived_key, output_path, CONTENT_TYPES[fmt])
+        await _count_rendition(db, project_id, bucket_name, object_key, os.path.getsize(output_path))
+        with open(output_path, "rb") as f:
+            return f.read(), etag
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _snap(value: Optional[int], step: int, limit: int) -> Optional[int]:
+    """Round up to a multiple of `step`, capped at `limit`"""
+    if not value or step <= 1:
+        return value
+    return min(-(-value // step) * step, limit)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+@router.get("/img/{bucket}/{object_key:path}")
+async def resize_image(
+    bucket: str,
+    object_key: str,
+    w: Optional[int] = Query(None, ge=1, le=settings.IMAGE_RESIZE_MAX_DIM),
+    h: Optional[int] = Query(None, ge=1, le=settings.IMAGE_RESIZE_MAX_DIM),
+    fmt: Literal["webp", "avif", "jpeg", "png"] = "webp",
+    q: int = Query(80, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    """Serve an image resized to fit w x h, rendering and caching it on first request.
+
+    w and h are rounded up to IMAGE_RESIZE_STEP and q to IMAGE_RESIZE_QUALITY_STEP,
+    so arbitrary parameters can't multiply the renditions stored per image.
+    """
+    if not w and not h:
+        raise HTTPException(status_code=400, detail="At least one of w or h is required")
+    w = _snap(w, settings.IMAGE_RESIZE_STEP, settings.IMAGE_RESIZE_MAX_DIM)
+    h = _snap(h, settings.IMAGE_RESIZE_STEP, settings.IMAGE_RESIZE_MAX_DIM)
+    q = _snap(q, settings.IMAGE_RESIZE_QUALITY_STEP, 100)
+
+    bucket_data = await get_or_create_bucket(db, str(project.id), bucket)
+
+    db_bucket = Bucket(**bucket_data)
+
+    # Duplicates share the renditions of the object that holds their content
+    if settings.DEDUP_ENABLED:
+        file_doc = await find_file(db, str(project.id), bucket, object_key)
+        if file_doc and file_doc.get("storage_key"):
+            object_key = file_doc["storage_key"]
+
+    derived_key = variant_key(object_key, f"w{w or 0}-h{h or 0}-q{q}", fmt)
+    cache_key = (db_bucket.physical_name, derived_key)
+
+    cached = variant_cache.get(cache_key)
+    if cached is None:
+        render = _renders.get(cache_key)
+        if render is None:
+            render = asyncio.ensure_future(
+                _load_variant(db, str(project.id), bucket, db_bucket.physical_name, object_key, derived_key, w, h, fmt, q)
+            )
+            _renders[cache_key] = render
+            render.add_done_callback(lambda _: _renders.pop(cache_key, None))
+        # Shielded so one client disconnecting doesn't cancel the shared render
+        cached = await asyncio.shield(render)
+        variant_cache.set(cache_key, cached)
+
+    content, etag = cached
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={settings.IMAGE_RESIZE_MAX_AGE}"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=CONTENT_TYPES[fmt], headers=headers)
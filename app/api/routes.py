@@ -1,97 +1,138 @@
+import asyncio
+import logging
 import os
 import uuid
 from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from minio.error import S3Error
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.metrics import dependency_timer
 from app.core.security import get_current_project
 from app.models.file import File
 from app.models.project import Project, Bucket
 from app.schemas.models import (
-    UploadInitRequest, UploadInitResponse,
+    UploadInitRequest, UploadInitResponse, UploadPartUrl,
+    UploadInitBatchRequest, UploadInitBatchResponse,
     UploadCompleteRequest, UploadCompleteResponse,
+    UploadCompleteBatchRequest, UploadCompleteBatchItem, UploadCompleteBatchResponse,
+    UploadAbortRequest, UploadAbortResponse,
     FileDeleteRequest, FileDeleteResponse,
-    FileUrlRequest, FileUrlResponse
+    FileUrlRequest, FileUrlResponse,
+    FileListResponse
 )
+from app.services.dedup import acquire_content, content_hash_for, release_content
+from app.services.images import VARIANT_PREFIX, variant_cache
+from app.services.listing import list_files
+from app.services.queue import enqueue_jobs, processing_job
 from app.services.storage import storage_service
-from app.worker import optimize_image, transcode_video, sanitize_document
+from app.services.usage import add_usage
+
+logger = logging.getLogger(__name__)
+
+# (project_id, logical bucket name) -> bucket document
+bucket_cache = TTLCache(maxsize=settings.BUCKET_CACHE_MAXSIZE, ttl=settings.BUCKET_CACHE_TTL)
+
+def invalidate_bucket(project_id: str, bucket_name: Optional[str] = None):
+    """Evict one cached bucket, or every bucket of the project when no name is given."""
+    if bucket_name is not None:
+        bucket_cache.delete((project_id, bucket_name))
+    else:
+        bucket_cache.delete_where(lambda key, _: key[0] == project_id)
 
 async def get_or_create_bucket(db, project_id: str, bucket_name: str) -> dict:
-    bucket_data = await db.buckets.find_one({"name": bucket_name, "project_id": project_id})
-    if bucket_data:
+    cache_key = (project_id, bucket_name)
+    bucket_data = bucket_cache.get(cache_key)
+    if bucket_data is not None:
         return bucket_data
-    
-    import json
-    physical_name = f"{project_id}-{bucket_name.lower()}-{str(uuid.uuid4())[:8]}"
-    try:
-        if not storage_service.client.bucket_exists(bucket_name=physical_name):
-            storage_service.client.make_bucket(bucket_name=physical_name)
-            policy = {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Effect": "Allow",
-                        "Principal": {"AWS": "*"},
-                        "Action": ["s3:GetObject"],
-                        "Resource": [f"arn:aws:s3:::{physical_name}/*"]
-                    }
-                ]
-            }
-            storage_service.client.set_bucket_policy(bucket_name=physical_name, policy=json.dumps(policy))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create bucket in storage: {str(e)}")
 
+    # Atomic upsert on the unique (project_id, name) index: concurrent first
+    # uploads all get the same document and only the inserter touches MinIO.
+    physical_name = f"{project_id}-{bucket_name.lower()}-{str(uuid.uuid4())[:8]}"
     new_bucket = Bucket(
         name=bucket_name,
         physical_name=physical_name,
         project_id=project_id
     )
-    result = await db.buckets.insert_one(new_bucket.model_dump(by_alias=True, exclude={"id"}))
-    return await db.buckets.find_one({"_id": result.inserted_id})
+    with dependency_timer("mongo", "bucket_resolve"):
+        try:
+            bucket_data = await db.buckets.find_one_and_update(
+                {"project_id": project_id, "name": bucket_name},
+                {"$setOnInsert": new_bucket.model_dump(by_alias=True, exclude={"id", "name", "project_id"})},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost the upsert race to another request; its document is now visible
+            bucket_data = await db.buckets.find_one({"project_id": project_id, "name": bucket_name})
 
-router = APIRouter(dependencies=[Depends(get_current_project)])
+    if bucket_data["physical_name"] == physical_name:
+        try:
+            await storage_service.create_public_bucket(physical_name)
+        except Exception as e:
+            await db.buckets.delete_one({"_id": bucket_data["_id"]})
+            raise HTTPException(status_code=500, detail=f"Failed to create bucket in storage: {str(e)}")
+        await add_usage(db, project_id, buckets=1)
 
+    bucket_cache.set(cache_key, bucket_data)
+    return bucket_data
 
-@router.post("/upload/init", response_model=UploadInitResponse)
-async def init_upload(
-    request: UploadInitRequest, 
-    project: Project = Depends(get_current_project),
-    db = Depends(get_db)
-):
-    # Validate Bucket
-    if not request.bucket:
-        raise HTTPException(status_code=400, detail="Bucket name is required")
-    
-    bucket_data = await get_or_create_bucket(db, str(project.id), request.bucket)
-    
-    db_bucket = Bucket(**bucket_data)
+def upload_key_prefix(now: datetime) -> str:
+    return f"uploads/{now.strftime('%Y')}/{now.strftime('%m')}"
 
+def multipart_part_size(file_size: int) -> int:
+    # Grow parts (in whole MiB) when the default size would exceed the S3 part limit
+    min_size = -(-file_size // settings.MULTIPART_MAX_PARTS)
+    part_size = max(settings.MULTIPART_PART_SIZE, min_size)
+    mib = 1024 * 1024
+    return -(-part_size // mib) * mib
+
+async def build_upload_init(db, physical_name: str, request: UploadInitRequest, prefix: str) -> UploadInitResponse:
     # Generate object key: uploads/year/month/uuid.ext
-    now = datetime.utcnow()
-    year = now.strftime("%Y")
-    month = now.strftime("%m")
     ext = os.path.splitext(request.filename)[1]
-    if not ext:
-        ext = "" # or handle error
-    
-    file_uuid = str(uuid.uuid4())
-    object_key = f"uploads/{year}/{month}/{file_uuid}{ext}"
-    
+    object_key = f"{prefix}/{uuid.uuid4()}{ext}"
+
     if request.folder:
         object_key = f"{request.folder}/{object_key}"
 
+    # Construct final URL (public or CDN)
+    final_url = f"https://{settings.MINIO_ENDPOINT}/{physical_name}/{object_key}"
+
+    if request.multipart:
+        upload_id = await storage_service.create_multipart_upload(physical_name, object_key, request.file_type)
+        # The janitor aborts uploads that are never completed from this record
+        await db.multipart_uploads.insert_one({
+            "bucket": physical_name,
+            "object_key": object_key,
+            "upload_id": upload_id,
+            "created_at": datetime.utcnow()
+        })
+        part_size = multipart_part_size(request.file_size)
+        part_count = max(1, -(-request.file_size // part_size))
+        part_urls = storage_service.presign_upload_parts(physical_name, object_key, upload_id, part_count)
+        return UploadInitResponse(
+            object_key=object_key,
+            final_url=final_url,
+            expires_in=settings.PRESIGNED_EXPIRY,
+            upload_id=upload_id,
+            part_size=part_size,
+            parts=[UploadPartUrl(part_number=n, url=url) for n, url in enumerate(part_urls, start=1)]
+        )
+
     # Generate presigned URL
     upload_url = storage_service.generate_presigned_url(
-        bucket_name=db_bucket.physical_name,
+        bucket_name=physical_name,
         object_name=object_key,
         method="PUT"
     )
-    
-    # Construct final URL (public or CDN)
-    final_url = f"https://{settings.MINIO_ENDPOINT}/{db_bucket.physical_name}/{object_key}"
-    
+
     return UploadInitResponse(
         upload_url=upload_url,
         object_key=object_key,
@@ -99,6 +140,182 @@ async def init_upload(
         expires_in=settings.PRESIGNED_EXPIRY
     )
 
+async def finish_multipart(db, physical_name: str, request: UploadCompleteRequest):
+    """Assemble a multipart upload; no-op for single-PUT uploads"""
+    if not request.upload_id:
+        return
+    if not request.parts:
+        raise HTTPException(status_code=400, detail="Parts are required to complete a multipart upload")
+    try:
+        await storage_service.complete_multipart_upload(
+            physical_name, request.object_key, request.upload_id,
+            [(part.part_number, part.etag) for part in request.parts]
+        )
+    except S3Error as e:
+        # A retry after an assembly that succeeded: the upload is gone but the object is there
+        if e.code != "NoSuchUpload" or not await _assembled(physical_name, request):
+            raise HTTPException(status_code=400, detail=f"Failed to complete multipart upload: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to complete multipart upload: {str(e)}")
+    await db.multipart_uploads.delete_one({"upload_id": request.upload_id})
+
+async def _assembled(physical_name: str, request: UploadCompleteRequest) -> bool:
+    """Whether the object of a finished multipart upload exists with the size the client reported"""
+    try:
+        stat_result = await storage_service.get_object_stats(bucket_name=physical_name, object_name=request.object_key)
+    except Exception:
+        return False
+    return stat_result.size == request.file_size
+
+# Processing results a duplicate copies from the file it shares content with
+MIRRORED_FIELDS = ("status", "scan_result", "optimized_version", "variants", "size", "derived_size", "content_type")
+
+async def _holds_digest(physical_name: str, object_key: str, content_hash: str) -> bool:
+    """Whether an object hashes to a client-supplied SHA-256"""
+    try:
+        return await storage_service.sha256_object(physical_name, object_key) == content_hash.removeprefix("sha256:")
+    except Exception as e:
+        logger.warning("Could not verify the content of %s: %s", object_key, e)
+        return False
+
+async def _matches_content(physical_name: str, object_key: str, size: int, blob: dict, content_hash: str) -> bool:
+    """Whether an upload really holds the blob's content, checked before its copy is dropped.
+
+    MD5 hashes come from MinIO's own ETag. A SHA-256 is client-supplied, so
+    the upload is hashed here; the stored object was hashed when its blob
+    was created (processing may have rewritten it since), and a blob that
+    never passed that check is not shared.
+    """
+    if blob.get("size") != size:
+        return False
+    if not content_hash.startswith("sha256:"):
+        return True
+    if not blob.get("verified"):
+        return False
+    return await _holds_digest(physical_name, object_key, content_hash)
+
+async def dedup_upload(db, project_id: str, bucket_name: str, physical_name: str,
+                       object_key: str, file_id: str, size: int, content_hash: Optional[str]) -> dict:
+    """Point a finished upload at identical stored content; returns extra File fields.
+
+    The first upload of some content keeps its object and gets processed;
+    later ones mirror the first file's results, and their own copy is
+    removed by `drop_duplicate_object` once the file document is written.
+    """
+    if not settings.DEDUP_ENABLED or not content_hash:
+        return {}
+
+    blob = await acquire_content(db, project_id, bucket_name, content_hash, object_key, file_id, size)
+    fields = {"content_hash": content_hash, "storage_key": blob["object_key"]}
+    if blob["object_key"] == object_key:
+        # First upload of this content: check a client-supplied SHA-256 now,
+        # while the object is still as uploaded and no job has touched it
+        if content_hash.startswith("sha256:") and not blob.get("verified"):
+            if not await _holds_digest(physical_name, object_key, content_hash):
+                logger.warning("Upload %s does not hash to %s; not deduplicating it", object_key, content_hash)
+                # Dropped outright so no later upload is matched against it
+                await db.blobs.delete_one({"_id": blob["_id"], "object_key": object_key})
+                return {}
+            await db.blobs.update_one({"_id": blob["_id"]}, {"$set": {"verified": True}})
+        return fields
+
+    if not await _matches_content(physical_name, object_key, size, blob, content_hash):
+        logger.warning("Upload %s does not match the stored content for %s; keeping it separate", object_key, content_hash)
+        orphan = await release_content(db, project_id, bucket_name, content_hash)
+        if orphan:
+            # Every other reference went away meanwhile
+            await storage_service.delete_object(bucket_name=physical_name, object_name=orphan)
+        return {}
+
+    fields["source_file_id"] = blob["file_id"]
+
+    # The source file may be gone already; any other duplicate of it will do
+    source = await db.files.find_one(
+        {"$or": [{"_id": ObjectId(blob["file_id"])}, {"source_file_id": blob["file_id"]}]},
+        {field: 1 for field in MIRRORED_FIELDS}
+    )
+    if source:
+        fields.update({field: source[field] for field in MIRRORED_FIELDS if field in source})
+    return fields
+
+async def drop_duplicate_object(physical_name: str, object_key: str, storage_key: Optional[str]):
+    """Delete an upload's own copy once its file document points at the shared object"""
+    if not storage_key or storage_key == object_key:
+        return
+    try:
+        await storage_service.delete_object(bucket_name=physical_name, object_name=object_key)
+    except Exception as e:
+        # Retrying the complete deletes it again
+        logger.warning("Failed to delete duplicate upload %s: %s", object_key, e)
+
+async def find_file(db, project_id: str, bucket_name: str, object_key: str) -> Optional[dict]:
+    return await db.files.find_one(
+        {"project_id": project_id, "bucket_name": bucket_name, "object_key": object_key},
+        {"storage_key": 1, "content_hash": 1, "size": 1}
+    )
+
+async def dispatch_jobs(db, background_tasks: BackgroundTasks, jobs: list):
+    jobs = [job for job in jobs if job]
+    try:
+        if settings.JOB_QUEUE_BACKEND == "local":
+            # Worker tasks are plain functions, so Starlette runs them in its threadpool
+            from app.worker import TASKS
+            for task, kwargs in jobs:
+                background_tasks.add_task(TASKS[task], **kwargs)
+        else:
+            await enqueue_jobs(db, jobs)
+    except Exception as e:
+        logger.warning("Failed to trigger background tasks: %s", e)
+
+router = APIRouter(dependencies=[Depends(get_current_project)])
+
+
+@router.post("/upload/init", response_model=UploadInitResponse)
+async def init_upload(
+    request: UploadInitRequest, 
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    # Validate Bucket
+    if not request.bucket:
+        raise HTTPException(status_code=400, detail="Bucket name is required")
+    
+    bucket_data = await get_or_create_bucket(db, str(project.id), request.bucket)
+    
+    db_bucket = Bucket(**bucket_data)
+
+    return await build_upload_init(db, db_bucket.physical_name, request, upload_key_prefix(datetime.utcnow()))
+
+@router.post("/upload/init/batch", response_model=UploadInitBatchResponse)
+async def init_upload_batch(
+    request: UploadInitBatchRequest,
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    """Presign PUT URLs for several files in one call"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(request.items) > settings.UPLOAD_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.UPLOAD_BATCH_MAX_ITEMS} items are allowed per batch"
+        )
+    if any(not item.bucket for item in request.items):
+        raise HTTPException(status_code=400, detail="Bucket name is required")
+
+    # Resolve each distinct bucket once
+    bucket_names = list(dict.fromkeys(item.bucket for item in request.items))
+    buckets = await asyncio.gather(*(
+        get_or_create_bucket(db, str(project.id), name) for name in bucket_names
+    ))
+    physical_names = {name: data["physical_name"] for name, data in zip(bucket_names, buckets)}
+
+    prefix = upload_key_prefix(datetime.utcnow())
+    return UploadInitBatchResponse(items=await asyncio.gather(*(
+        build_upload_init(db, physical_names[item.bucket], item, prefix)
+        for item in request.items
+    )))
+
 @router.post("/upload/complete", response_model=UploadCompleteResponse)
 async def complete_upload(
     request: UploadCompleteRequest, 
@@ -113,51 +330,80 @@ async def complete_upload(
     
     db_bucket = Bucket(**bucket_data)
 
-    # Debug logging
-    print(f"DEBUG: Checking for file in bucket: {db_bucket.physical_name}")
-    print(f"DEBUG: Object key: {request.object_key}")
+    logger.debug("Completing upload %s/%s", db_bucket.physical_name, request.object_key)
+
+    # The upload may already be recorded, with its jobs queued: by the object
+    # event when bucket notifications are on, or by an earlier attempt of
+    # this call that the client is retrying (its parts are assembled by then)
+    existing = await find_file(db, str(project.id), request.bucket, request.object_key)
+    if not existing:
+        await finish_multipart(db, db_bucket.physical_name, request)
+    elif request.upload_id:
+        await db.multipart_uploads.delete_one({"upload_id": request.upload_id})
 
     # Try to verify object exists (optional - may fail due to permissions)
     file_size = request.file_size  # Use provided size as fallback
+    etag = None
     try:
-        stat_result = storage_service.get_object_stats(bucket_name=db_bucket.physical_name, object_name=request.object_key)
+        stat_result = await storage_service.get_object_stats(bucket_name=db_bucket.physical_name, object_name=request.object_key)
         file_size = stat_result.size
-        print(f"DEBUG: File verified! Size: {stat_result.size}")
+        etag = stat_result.etag
     except Exception as e:
-        print(f"DEBUG: Could not verify file (using provided size): {str(e)}")
+        logger.debug("Could not verify %s (using provided size): %s", request.object_key, e)
         # Continue anyway - file was uploaded successfully via presigned URL
 
-    # Save File Metadata to DB
-    new_file = File(
-        project_id=str(project.id),
-        bucket_name=request.bucket,
-        object_key=request.object_key,
-        size=file_size,
-        content_type=request.file_type
-    )
-    new_file_doc = await db.files.insert_one(new_file.model_dump(by_alias=True, exclude={"id"}))
-    file_id = str(new_file_doc.inserted_id)
+    file_id = existing["_id"] if existing else ObjectId()
 
-    # Trigger Virus Scan (Async)
+    if existing and existing.get("content_hash"):
+        # Content already resolved; a duplicate's own object may be gone by now
+        dedup_fields = {"storage_key": existing["storage_key"]} if existing.get("storage_key") else {}
+        file_size = existing["size"]
+    else:
+        dedup_fields = await dedup_upload(
+            db, str(project.id), request.bucket, db_bucket.physical_name, request.object_key,
+            str(file_id), file_size, content_hash_for(request.content_hash, etag)
+        )
+    storage_key = dedup_fields.get("storage_key", request.object_key)
+
+    # Save File Metadata to DB
+    new_file = File(**{
+        "project_id": str(project.id),
+        "bucket_name": request.bucket,
+        "object_key": request.object_key,
+        "size": file_size,
+        "content_type": request.file_type,
+        **dedup_fields
+    })
     try:
-        # background_tasks.add_task(scan_file, bucket_name=db_bucket.physical_name, object_key=request.object_key, file_id=file_id)
-        
-        # Trigger Image Optimization if applicable
-        if request.file_type.startswith("image/") and request.optimize:
-            background_tasks.add_task(optimize_image, bucket_name=db_bucket.physical_name, object_key=request.object_key, file_id=file_id)
-            
-        # Trigger Video Transcoding if applicable
-        elif request.file_type.startswith("video/"):
-            background_tasks.add_task(transcode_video, bucket_name=db_bucket.physical_name, object_key=request.object_key, file_id=file_id)
-            
-        # Trigger Document Sanitization if applicable
-        elif request.file_type == "application/pdf":
-            background_tasks.add_task(sanitize_document, bucket_name=db_bucket.physical_name, object_key=request.object_key, file_id=file_id)
-            
-    except Exception as e:
-        print(f"WARNING: Failed to trigger background tasks: {e}")
+        if existing:
+            await db.files.update_one({"_id": file_id}, {"$set": {
+                "content_type": request.file_type, "content_family": new_file.content_family, **dedup_fields
+            }})
+        else:
+            with dependency_timer("mongo", "file_insert"):
+                await db.files.insert_one({"_id": file_id, **new_file.model_dump(by_alias=True, exclude={"id"})})
+    except DuplicateKeyError:
+        # A concurrent complete or the object event recorded it first and queued its jobs
+        if dedup_fields.get("content_hash"):
+            await release_content(db, str(project.id), request.bucket, dedup_fields["content_hash"])
+        existing = await find_file(db, str(project.id), request.bucket, request.object_key)
+        storage_key = existing.get("storage_key") or request.object_key
+        file_size = existing["size"]
+    except Exception:
+        if dedup_fields.get("content_hash"):
+            await release_content(db, str(project.id), request.bucket, dedup_fields["content_hash"])
+        raise
+    if not existing:
+        await add_usage(db, str(project.id), files=1, size=new_file.size + new_file.derived_size)
+    # Only now that the document points at the shared object
+    await drop_duplicate_object(db_bucket.physical_name, request.object_key, storage_key)
+
+    # Duplicates reuse the results of the first upload's processing
+    if storage_key == request.object_key and not existing:
+        await dispatch_jobs(db, background_tasks, [processing_job(db_bucket, request.object_key, request.file_type, str(file_id), request.optimize)])
 
-    final_url = f"https://{settings.MINIO_ENDPOINT}/{db_bucket.physical_name}/{request.object_key}"
+    # Canonical URL: a duplicate's object_key URL from /upload/init no longer resolves
+    final_url = f"https://{settings.MINIO_ENDPOINT}/{db_bucket.physical_name}/{storage_key}"
 
     return UploadCompleteResponse(
         object_key=request.object_key,
@@ -166,6 +412,169 @@ async def complete_upload(
         size=file_size
     )
 
+@router.post("/upload/complete/batch", response_model=UploadCompleteBatchResponse)
+async def complete_upload_batch(
+    request: UploadCompleteBatchRequest,
+    background_tasks: BackgroundTasks,
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    """Record several finished uploads; returns a result per item, in request order"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(request.items) > settings.UPLOAD_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.UPLOAD_BATCH_MAX_ITEMS} items are allowed per batch"
+        )
+
+    results: list = [None] * len(request.items)
+    for i, item in enumerate(request.items):
+        if not item.bucket:
+            results[i] = UploadCompleteBatchItem(object_key=item.object_key, status="failed", error="Bucket name is required")
+
+    # Resolve each distinct bucket once
+    bucket_names = list(dict.fromkeys(item.bucket for item in request.items if item.bucket))
+    resolved = await asyncio.gather(
+        *(get_or_create_bucket(db, str(project.id), name) for name in bucket_names),
+        return_exceptions=True
+    )
+    db_buckets, physical_names = {}, {}
+    for name, data in zip(bucket_names, resolved):
+        if isinstance(data, Exception):
+            error = data.detail if isinstance(data, HTTPException) else str(data)
+            for i, item in enumerate(request.items):
+                if item.bucket == name:
+                    results[i] = UploadCompleteBatchItem(object_key=item.object_key, status="failed", error=error)
+        else:
+            db_buckets[name] = Bucket(**data)
+            physical_names[name] = data["physical_name"]
+
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    # Assemble multipart uploads and stat objects concurrently; like the single
+    # endpoint, fall back to the client-reported size when the stat fails
+    semaphore = asyncio.Semaphore(settings.UPLOAD_BATCH_STAT_CONCURRENCY)
+
+    async def resolve_item(item: UploadCompleteRequest) -> tuple[dict, Optional[dict]]:
+        """Build the file document; the update is set when the object event recorded it first"""
+        async with semaphore:
+            existing = await find_file(db, str(project.id), item.bucket, item.object_key)
+            if not existing:
+                await finish_multipart(db, physical_names[item.bucket], item)
+            elif item.upload_id:
+                await db.multipart_uploads.delete_one({"upload_id": item.upload_id})
+            size, etag = item.file_size, None
+            try:
+                stat_result = await storage_service.get_object_stats(
+                    bucket_name=physical_names[item.bucket], object_name=item.object_key
+                )
+                size, etag = stat_result.size, stat_result.etag
+            except Exception:
+                pass
+            file_id = existing["_id"] if existing else ObjectId()
+            if existing and existing.get("content_hash"):
+                dedup_fields = {"storage_key": existing["storage_key"]} if existing.get("storage_key") else {}
+                size = existing["size"]
+            else:
+                dedup_fields = await dedup_upload(
+                    db, str(project.id), item.bucket, physical_names[item.bucket], item.object_key,
+                    str(file_id), size, content_hash_for(item.content_hash, etag)
+                )
+            doc = File(**{
+                "project_id": str(project.id),
+                "bucket_name": item.bucket,
+                "object_key": item.object_key,
+                "size": size,
+                "content_type": item.file_type,
+                **dedup_fields
+            }).model_dump(by_alias=True, exclude={"id"})
+            update = {"content_type": item.file_type, "content_family": doc["content_family"], **dedup_fields} if existing else None
+            return {"_id": file_id, **doc}, update
+
+    resolved_docs = await asyncio.gather(
+        *(resolve_item(request.items[i]) for i in pending), return_exceptions=True
+    )
+    for i, resolved_doc in zip(pending, resolved_docs):
+        if isinstance(resolved_doc, Exception):
+            error = resolved_doc.detail if isinstance(resolved_doc, HTTPException) else str(resolved_doc)
+            results[i] = UploadCompleteBatchItem(object_key=request.items[i].object_key, status="failed", error=error)
+    verified = [(i, *resolved_doc) for i, resolved_doc in zip(pending, resolved_docs) if results[i] is None]
+
+    # Single unordered write
+    write_errors = {}
+    if verified:
+        try:
+            with dependency_timer("mongo", "file_insert_batch"):
+                await db.files.bulk_write([
+                    UpdateOne({"_id": doc["_id"]}, {"$set": update}) if update else InsertOne(doc)
+                    for _, doc, update in verified
+                ], ordered=False)
+        except BulkWriteError as e:
+            write_errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+    jobs, duplicates = [], []
+    added_files, added_size = 0, 0
+    for n, (i, doc, update) in enumerate(verified):
+        item = request.items[i]
+        if n in write_errors:
+            if doc.get("content_hash"):
+                await release_content(db, str(project.id), item.bucket, doc["content_hash"])
+            if write_errors[n].get("code") != 11000:
+                results[i] = UploadCompleteBatchItem(
+                    object_key=item.object_key, status="failed", error=write_errors[n].get("errmsg", "Write failed")
+                )
+                continue
+            # Recorded concurrently (another complete or the object event), jobs included
+            existing = await find_file(db, str(project.id), item.bucket, item.object_key)
+            doc = {**doc, "size": existing["size"], "storage_key": existing.get("storage_key")}
+            update = {}
+
+        if update is None:
+            added_files += 1
+            added_size += doc["size"] + doc["derived_size"]
+
+        physical_name = physical_names[item.bucket]
+        storage_key = doc.get("storage_key") or item.object_key
+        duplicates.append(drop_duplicate_object(physical_name, item.object_key, storage_key))
+        if storage_key == item.object_key and update is None:
+            jobs.append(processing_job(db_buckets[item.bucket], item.object_key, item.file_type, str(doc["_id"]), item.optimize))
+        results[i] = UploadCompleteBatchItem(
+            object_key=item.object_key,
+            status="completed",
+            final_url=f"https://{settings.MINIO_ENDPOINT}/{physical_name}/{storage_key}",
+            mime=item.file_type,
+            size=doc["size"]
+        )
+
+    await add_usage(db, str(project.id), files=added_files, size=added_size)
+    await asyncio.gather(*duplicates)
+    await dispatch_jobs(db, background_tasks, jobs)
+
+    return UploadCompleteBatchResponse(items=results)
+
+@router.post("/upload/abort", response_model=UploadAbortResponse)
+async def abort_upload(
+    request: UploadAbortRequest,
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    """Abort a multipart upload and discard its uploaded parts"""
+    if not request.bucket:
+        raise HTTPException(status_code=400, detail="Bucket name is required")
+
+    bucket_data = await get_or_create_bucket(db, str(project.id), request.bucket)
+
+    db_bucket = Bucket(**bucket_data)
+
+    try:
+        await storage_service.abort_multipart_upload(db_bucket.physical_name, request.object_key, request.upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to abort multipart upload: {str(e)}")
+    await db.multipart_uploads.delete_one({"upload_id": request.upload_id})
+
+    return UploadAbortResponse(status="aborted")
+
 @router.delete("/file", response_model=FileDeleteResponse)
 async def delete_file(
     request: FileDeleteRequest, 
@@ -179,15 +588,32 @@ async def delete_file(
     
     db_bucket = Bucket(**bucket_data)
 
-    # Remove from MinIO
-    storage_service.delete_object(bucket_name=db_bucket.physical_name, object_name=request.object_key)
-    
     # Remove from DB
-    await db.files.delete_one({
-        "project_id": str(project.id),
-        "bucket_name": request.bucket,
-        "object_key": request.object_key
-    })
+    file_doc = await db.files.find_one_and_delete(
+        {"project_id": str(project.id), "bucket_name": request.bucket, "object_key": request.object_key},
+        {"content_hash": 1, "size": 1, "derived_size": 1}
+    )
+    if file_doc:
+        await add_usage(db, str(project.id), files=-1, size=-file_doc["size"] - file_doc.get("derived_size", 0))
+
+    # Shared content stays in MinIO until its last file is deleted
+    object_key = request.object_key
+    if file_doc and file_doc.get("content_hash"):
+        object_key = await release_content(db, str(project.id), request.bucket, file_doc["content_hash"])
+        if object_key is None:
+            return FileDeleteResponse(status="deleted")
+
+    # Remove from MinIO
+    await storage_service.delete_object(bucket_name=db_bucket.physical_name, object_name=object_key)
+
+    # Remove derived renditions (bucket variants and /img resizes)
+    variant_prefix = f"{VARIANT_PREFIX}{object_key}/"
+    variant_cache.delete_where(lambda key, _: key[0] == db_bucket.physical_name and key[1].startswith(variant_prefix))
+    try:
+        async for obj in storage_service.list_objects(db_bucket.physical_name, prefix=variant_prefix):
+            await storage_service.delete_object(bucket_name=db_bucket.physical_name, object_name=obj.object_name)
+    except Exception as e:
+        logger.warning("Failed to delete variants of %s: %s", object_key, e)
 
     return FileDeleteResponse(status="deleted")
 
@@ -205,18 +631,51 @@ async def get_file_url(
     
     db_bucket = Bucket(**bucket_data)
 
+    # Deduplicated files are stored under another file's object
+    object_key = request.object_key
+    if settings.TRUST_FILE_METADATA or settings.DEDUP_ENABLED:
+        file_doc = await find_file(db, str(project.id), request.bucket, request.object_key)
+        if file_doc and file_doc.get("storage_key"):
+            object_key = file_doc["storage_key"]
+
     # Verify file exists
-    if not storage_service.check_object_exists(bucket_name=db_bucket.physical_name, object_name=request.object_key):
+    if settings.TRUST_FILE_METADATA:
+        exists = file_doc is not None
+    else:
+        exists = await storage_service.check_object_exists(bucket_name=db_bucket.physical_name, object_name=object_key)
+    if not exists:
         raise HTTPException(status_code=404, detail="File not found")
 
     # Generate presigned GET URL
     presigned_url = storage_service.generate_presigned_url(
         bucket_name=db_bucket.physical_name,
-        object_name=request.object_key,
-        method="GET"
+        object_name=object_key,
+        method="GET",
+        expires=request.expires_in
     )
 
     return FileUrlResponse(
         url=presigned_url,
         expires_in=request.expires_in
     )
+
+@router.get("/files", response_model=FileListResponse)
+async def list_project_files(
+    bucket: Optional[str] = None,
+    status: Optional[str] = None,
+    content_type: Optional[str] = None,
+    prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000),
+    project: Project = Depends(get_current_project),
+    db = Depends(get_db)
+):
+    """List the project's files, newest first, one page per call"""
+    try:
+        items, next_cursor = await list_files(
+            db, str(project.id), bucket=bucket, status=status, content_type=content_type,
+            prefix=prefix, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileListResponse(items=items, next_cursor=next_cursor)
@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Small in-process LRU cache with per-entry expiry and hit/miss counters.
+
+    Entries are local to the worker process, so invalidation only reaches the
+    process that performed it; the TTL bounds staleness everywhere else.
+    With `maxbytes`, entries are also evicted to keep the total of
+    `sizeof(value)` under it, and values larger than that are not stored.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0,
+                 maxbytes: int = 0, sizeof: Callable[[Any], int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+        self._lock = Lock()
+
+    def _pop(self, key: Hashable):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        size = self.sizeof(value) if self.maxbytes else 0
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or self.bytes > self.maxbytes > 0:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry whose (key, value) matches; returns the number removed."""
+        with self._lock:
+            stale = [k for k, (_, v, _) in self._data.items() if predicate(k, v)]
+            for k in stale:
+                self._pop(k)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "maxbytes": self.maxbytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal, Optional
 
 class Settings(BaseSettings):
     MINIO_ENDPOINT: str
@@ -9,15 +9,117 @@ class Settings(BaseSettings):
     
     MONGO_URI: str
     MONGO_DB_NAME: str
+    # Connection pool per process (API and worker alike)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    # Fail a request after waiting this long for a free connection
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    # Wire compression, in order of preference; ones whose module isn't installed are skipped
+    MONGO_COMPRESSORS: str = "zstd,zlib"
+    # Listing endpoints may read from secondaries (e.g. "secondaryPreferred")
+    MONGO_LIST_READ_PREFERENCE: Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"] = "primary"
     
     ADMIN_SECRET: str
 
     PRESIGNED_EXPIRY: int = 3600
+    UPLOAD_BATCH_MAX_ITEMS: int = 100
+    UPLOAD_BATCH_STAT_CONCURRENCY: int = 16
+    MULTIPART_PART_SIZE: int = 16 * 1024 * 1024
+    MULTIPART_MAX_PARTS: int = 10000
+    # Incomplete multipart uploads older than this (seconds) are aborted by the janitor
+    MULTIPART_STALE_AFTER: int = 86400
+    MULTIPART_JANITOR_INTERVAL: int = 3600
+    # GET URLs are reused within this window (seconds); 0 disables caching
+    PRESIGNED_CACHE_WINDOW: int = 300
+    # Check /file/url existence against the files collection instead of a MinIO HEAD
+    TRUST_FILE_METADATA: bool = False
+    # Store and process identical uploads (same content hash) once per bucket
+    DEDUP_ENABLED: bool = True
     MINIO_SECURE: bool = True
+    MINIO_REGION: str = "us-east-1"
+    MINIO_MAX_WORKERS: int = 32
+    MINIO_MAX_CONNECTIONS: int = 32
+    MINIO_CONNECT_TIMEOUT: float = 5
+    MINIO_READ_TIMEOUT: float = 60
+    # Bucket notifications: webhook target ARN set on new buckets (e.g.
+    # "arn:minio:sqs::PRIMARY:webhook") and the auth_token MinIO sends
+    MINIO_NOTIFY_ARN: Optional[str] = None
+    MINIO_WEBHOOK_TOKEN: Optional[str] = None
+    # Events wait this long (seconds) so complete_upload records uploads first
+    EVENT_SETTLE_SECONDS: int = 30
+    EVENT_BATCH_SIZE: int = 500
+    EVENT_POLL_INTERVAL: float = 2.0
     
+    # Build missing indexes from app/services/indexes.py in the background on startup
+    INDEX_RECONCILE_ON_STARTUP: bool = True
+    # Log the plan of each registered hot query after reconciling
+    INDEX_EXPLAIN_HOT_QUERIES: bool = True
+    # Drop and rebuild indexes whose options differ from the registry (otherwise only reported)
+    INDEX_REPAIR_DRIFT: bool = False
+
+    # Level-gated app logging; "json" emits one object per line
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    # Prometheus: /metrics on the API, and a scrape port for the worker (0 disables)
+    METRICS_ENABLED: bool = True
+    WORKER_METRICS_PORT: int = 9100
+
     REDIS_URL: str = "redis://localhost:6379/0"
+
+    # "mongo": persist jobs for `python -m app.worker`; "local": run them in the API process
+    JOB_QUEUE_BACKEND: Literal["mongo", "local"] = "mongo"
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF: int = 10
+    JOB_VISIBILITY_TIMEOUT: int = 900
+    WORKER_CONCURRENCY: int = 4
+    WORKER_POLL_INTERVAL: float = 1.0
+    # File status updates are flushed as one bulk write per this many files, or this often (seconds)
+    WORKER_WRITE_BATCH_SIZE: int = 500
+    WORKER_WRITE_FLUSH_INTERVAL: float = 1.0
+    # Image process pool size (0 = CPU count) and max images queued on it at once (0 = 2x pool size)
+    IMAGE_PROCESS_WORKERS: int = 0
+    IMAGE_MAX_IN_FLIGHT: int = 0
+    # Decompression-bomb guard: images above this pixel count are rejected before decoding
+    IMAGE_MAX_PIXELS: int = 100_000_000
+    # On-the-fly resize endpoint (/img)
+    IMAGE_RESIZE_MAX_DIM: int = 4096
+    IMAGE_RESIZE_CACHE_SIZE: int = 256
+    # Total bytes of renditions kept in memory per API process
+    IMAGE_RESIZE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Requested sizes are rounded up to this grid and quality to multiples of
+    # IMAGE_RESIZE_QUALITY_STEP, bounding the renditions stored per image
+    IMAGE_RESIZE_STEP: int = 64
+    IMAGE_RESIZE_QUALITY_STEP: int = 10
+    IMAGE_RESIZE_CACHE_TTL: int = 3600
+    IMAGE_RESIZE_MAX_AGE: int = 86400
+    # ffmpeg runs per worker process, and threads per run (0 = cores / runs)
+    VIDEO_MAX_CONCURRENT: int = 1
+    VIDEO_FFMPEG_THREADS: int = 0
+    VIDEO_HLS_SEGMENT_SECONDS: int = 6
+    VIDEO_UPLOAD_CONCURRENCY: int = 8
+    VIDEO_PROGRESS_INTERVAL: float = 5
+    # Lifetime (seconds) of the presigned URL ffmpeg reads the source from
+    VIDEO_INPUT_URL_EXPIRY: int = 6 * 3600
+    # Buckets purged in parallel by a project deletion job
+    PROJECT_DELETE_BUCKET_CONCURRENCY: int = 4
     CLAMAV_HOST: str = "192.168.0.153"
     CLAMAV_PORT: int = 3310
+    # Scan uploads before any other processing
+    CLAMAV_ENABLED: bool = True
+    CLAMAV_MAX_CONNECTIONS: int = 4
+    CLAMAV_CONNECT_TIMEOUT: float = 5
+    CLAMAV_TIMEOUT: float = 120
+    # clamd's StreamMaxLength; larger objects aren't streamed and are marked scan_skipped
+    CLAMAV_MAX_STREAM_SIZE: int = 25 * 1024 * 1024
+
+    # Authenticated projects are cached per process: a rotated or revoked key is
+    # dropped at once by the process handling the change, but keeps working in
+    # the other API processes for up to AUTH_CACHE_TTL seconds
+    AUTH_CACHE_TTL: int = 30
+    AUTH_CACHE_MAXSIZE: int = 1024
+    BUCKET_CACHE_TTL: int = 300
+    BUCKET_CACHE_MAXSIZE: int = 4096
 
     class Config:
         env_file = ".env"
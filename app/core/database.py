@@ -1,22 +1,197 @@
+"""
+MongoDB connection layer shared by the API (Motor) and the worker (PyMongo).
+
+Both clients are built from the same MONGO_* settings: pool bounds, checkout
+wait timeout, wire compression and TLS CA bundle. Both also report to the
+same pool listener, so checkouts, waits and timeouts can be read per
+process.
+"""
+import asyncio
+import importlib.util
+import logging
+import threading
+
+import certifi
 from motor.motor_asyncio import AsyncIOMotorClient
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import MongoClient, ReadPreference, monitoring
+
 from app.core.config import settings
-import certifi
+
+logger = logging.getLogger(__name__)
+
+# Compressor name -> module it needs (zlib ships with Python)
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters; callbacks arrive from driver threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.in_use = 0
+        self.open = 0
+        self.created = 0
+        self.cleared = 0
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_seconds += event.duration
+            self.max_wait_seconds = max(self.max_wait_seconds, event.duration)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.timeouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "timeouts": self.timeouts,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "avg_wait_ms": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "in_use": self.in_use,
+                "open": self.open,
+                "created": self.created,
+                "cleared": self.cleared,
+                "max_pool_size": settings.MONGO_MAX_POOL_SIZE,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class _PoolCollector:
+    """Serves the pool counters on /metrics as mongo_pool_* gauges"""
+
+    def collect(self):
+        for key, value in pool_metrics.snapshot().items():
+            yield GaugeMetricFamily(f"mongo_pool_{key}", f"MongoDB connection pool: {key.replace('_', ' ')}", value=value)
+
+
+REGISTRY.register(_PoolCollector())
+
+
+def available_compressors() -> list[str]:
+    """MONGO_COMPRESSORS minus those whose module isn't installed"""
+    names = [name.strip() for name in settings.MONGO_COMPRESSORS.split(",") if name.strip()]
+    available = [name for name in names if importlib.util.find_spec(_COMPRESSOR_MODULES.get(name, name))]
+    if len(available) < len(names):
+        logger.warning("MongoDB compressors not installed, skipped: %s", ", ".join(sorted(set(names) - set(available))))
+    return available
+
+
+def client_options() -> dict:
+    """Keyword arguments for MongoClient and AsyncIOMotorClient alike"""
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "tlsCAFile": certifi.where(),
+        "event_listeners": [pool_metrics],
+    }
+    compressors = available_compressors()
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+
+def listing_read_preference():
+    """Read preference for the listing endpoints (MONGO_LIST_READ_PREFERENCE)"""
+    return _READ_PREFERENCES[settings.MONGO_LIST_READ_PREFERENCE]
+
 
 class Database:
     client: AsyncIOMotorClient = None
     db = None
 
     def connect(self):
-        self.client = AsyncIOMotorClient(settings.MONGO_URI, tlsCAFile=certifi.where())
+        self.client = AsyncIOMotorClient(settings.MONGO_URI, appname="minio-backend-api", **client_options())
         self.db = self.client[settings.MONGO_DB_NAME]
-        print("Connected to MongoDB")
+        logger.info("Connected to MongoDB")
+
+    async def warm_up(self):
+        """Open MONGO_MIN_POOL_SIZE connections now rather than on the first requests"""
+        try:
+            await asyncio.gather(*(
+                self.client.admin.command("ping") for _ in range(max(1, settings.MONGO_MIN_POOL_SIZE))
+            ))
+            logger.info("MongoDB pool warmed up (%d connections)", pool_metrics.open)
+        except Exception as e:
+            # Requests will retry server selection on their own
+            logger.warning("MongoDB warm-up failed: %s", e)
 
     def close(self):
         if self.client:
             self.client.close()
-            print("Disconnected from MongoDB")
+            logger.info("Disconnected from MongoDB")
 
 db = Database()
 
 async def get_db():
     return db.db
+
+def connect_sync(appname: str = "minio-backend-worker"):
+    """Synchronous database handle for the worker, with the API's pool settings"""
+    client = MongoClient(settings.MONGO_URI, appname=appname, **client_options())
+    return client, client[settings.MONGO_DB_NAME]
@@ -0,0 +1,85 @@
+"""
+Prometheus metrics for the API and the worker.
+
+The API serves them at /metrics; the worker, which has no HTTP server of
+its own, exposes them on WORKER_METRICS_PORT. Histograms are labelled by
+route template, dependency call and worker stage, never by raw path or
+object key, so cardinality stays bounded.
+"""
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_duration_seconds",
+    "Latency of calls to MongoDB and MinIO made while serving requests and jobs",
+    ["dependency", "operation"],
+)
+WORKER_STAGE_LATENCY = Histogram(
+    "worker_stage_duration_seconds",
+    "Time spent in each stage of a worker job",
+    ["task", "stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+JOBS_PROCESSED = Counter(
+    "worker_jobs_total",
+    "Worker jobs finished, by outcome",
+    ["task", "outcome"],
+)
+JOBS_IN_FLIGHT = Gauge(
+    "worker_jobs_in_flight",
+    "Jobs currently being processed by this worker",
+    ["task"],
+)
+QUEUE_DEPTH = Gauge(
+    "job_queue_depth",
+    "Jobs in the MongoDB queue by status",
+    ["status"],
+)
+EVENT_BACKLOG = Gauge(
+    "object_events_pending",
+    "Bucket notifications recorded but not yet applied",
+)
+
+
+def dependency_timer(dependency: str, operation: str):
+    """`with dependency_timer("mongo", "auth_lookup"):` records the block's duration"""
+    return DEPENDENCY_LATENCY.labels(dependency, operation).time()
+
+
+def stage_timer(task: str, stage: str):
+    """`with stage_timer("optimize_image", "download"):` records the block's duration"""
+    return WORKER_STAGE_LATENCY.labels(task, stage).time()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency under the matched route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # FastAPI puts the matched route in the scope; mounts and 404s share a label
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
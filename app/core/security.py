@@ -1,10 +1,26 @@
+import hashlib
+
 from fastapi import Security, HTTPException, status, Depends
 from fastapi.security import APIKeyHeader
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.metrics import dependency_timer
 from app.models.project import Project
 
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
+# Keyed by a hash of the API key, and the cached projects have their key
+# blanked, so the cache never holds raw keys
+project_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAXSIZE, ttl=settings.AUTH_CACHE_TTL)
+
+def _api_key_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def invalidate_project(project_id: str) -> int:
+    """Evict every cached entry for a project (key rotation, deletion)."""
+    return project_cache.delete_where(lambda _, project: project.id == project_id)
+
 async def get_current_project(
     api_key_header: str = Security(api_key_header),
     db = Depends(get_db)
@@ -14,27 +30,36 @@ async def get_current_project(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    
+
     # Handle "ApiKey <key>" format or just "<key>"
     if api_key_header.startswith("ApiKey "):
         token = api_key_header.split(" ")[1]
     else:
         token = api_key_header
 
-    project_data = await db.projects.find_one({"api_key": token})
+    digest = _api_key_digest(token)
+    project = project_cache.get(digest)
+    if project is not None:
+        return project
+
+    # Tombstoned projects stop authenticating as soon as deletion starts
+    with dependency_timer("mongo", "auth_lookup"):
+        project_data = await db.projects.find_one({"api_key": token, "deleted_at": None})
     if not project_data:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid API Key",
         )
-    return Project(**project_data)
+    # Handlers never need the key itself
+    project = Project(**project_data).model_copy(update={"api_key": ""})
+    project_cache.set(digest, project)
+    return project
 
 admin_secret_header = APIKeyHeader(name="X-Admin-Secret", auto_error=False)
 
 async def verify_admin(
     secret: str = Security(admin_secret_header)
 ):
-    from app.core.config import settings
     if not secret or secret != settings.ADMIN_SECRET:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,10 +1,22 @@
-from pydantic import BaseModel, Field, BeforeValidator
-from typing import Optional, Annotated
+from pydantic import BaseModel, Field, BeforeValidator, model_validator
+from typing import Optional, List, Annotated
 from datetime import datetime
 
 # Helper for ObjectId
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
+def content_family(content_type: str) -> str:
+    """Top-level media type, e.g. "image" for image/png; listings filter "image/" on it"""
+    return content_type.split("/", 1)[0]
+
+class ImageVariant(BaseModel):
+    name: str
+    object_key: str
+    width: int
+    height: int
+    content_type: str
+    size: int
+
 class File(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     project_id: str
@@ -12,12 +24,27 @@ class File(BaseModel):
     object_key: str
     size: int
     content_type: str
+    content_family: Optional[str] = None # Derived from content_type when not given
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # Deduplication: identical content shares one physical object
+    content_hash: Optional[str] = None
+    storage_key: Optional[str] = None # Physical object holding the content
+    source_file_id: Optional[str] = None # File whose processing results this one mirrors
     
     # Phase 2: Processing Status
     status: str = "pending" # pending, clean, infected, optimized
     scan_result: Optional[str] = None
-    optimized_version: Optional[str] = None # Object key of optimized file
+    optimized_version: Optional[str] = None # Object key of optimized file (HLS master playlist for videos)
+    progress: Optional[float] = None # Transcoding progress, percent
+    variants: Optional[List[ImageVariant]] = None # Responsive image renditions
+    derived_size: int = 0 # Bytes of stored renditions (image variants, HLS ladder), counted in usage
+
+    @model_validator(mode="after")
+    def _derive_content_family(self):
+        if self.content_family is None:
+            self.content_family = content_family(self.content_type)
+        return self
 
     class Config:
         populate_by_name = True
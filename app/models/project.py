@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, BeforeValidator
-from typing import Optional, List, Annotated
+from pydantic import AfterValidator, BaseModel, Field, BeforeValidator
+from typing import Optional, List, Annotated, Literal
 from datetime import datetime
 
 # Helper for ObjectId
@@ -10,6 +10,7 @@ class Project(BaseModel):
     name: str
     api_key: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    deleted_at: Optional[datetime] = None # Tombstone: set while a deletion job purges the project
 
     class Config:
         populate_by_name = True
@@ -20,12 +21,33 @@ class Project(BaseModel):
             }
         }
 
+MAX_IMAGE_VARIANTS = 8
+
+class ImageVariantSpec(BaseModel):
+    # Used in the derived object key and the worker's temp file name
+    name: str = Field(pattern=r"^[a-z0-9_-]{1,32}$") # e.g. "w640", "thumb"
+    width: int = Field(ge=1, le=4096)
+    format: Literal["webp", "avif", "jpeg"] = "webp"
+    quality: int = Field(80, ge=1, le=100)
+
+def _unique_variant_names(variants: List[ImageVariantSpec]) -> List[ImageVariantSpec]:
+    names = [variant.name for variant in variants]
+    if len(set(names)) != len(names):
+        raise ValueError("Image variant names must be unique")
+    return variants
+
+ImageVariants = Annotated[
+    List[ImageVariantSpec], Field(max_length=MAX_IMAGE_VARIANTS), AfterValidator(_unique_variant_names)
+]
+
 class Bucket(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     name: str
     physical_name: str
     project_id: str # Store as string (ObjectId)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Responsive renditions generated for uploaded images; None keeps the single optimized WebP
+    image_variants: Optional[ImageVariants] = None
 
     class Config:
         populate_by_name = True
@@ -40,9 +62,11 @@ class ProjectRead(Project):
 
 class BucketCreate(BaseModel):
     name: str
+    image_variants: Optional[ImageVariants] = None
 
 class BucketRead(BaseModel):
     id: PyObjectId = Field(alias="_id")
     name: str
     physical_name: str
     created_at: datetime
+    image_variants: Optional[ImageVariants] = None
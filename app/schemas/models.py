@@ -1,5 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+from app.models.file import PyObjectId
 
 class UploadInitRequest(BaseModel):
     filename: str
@@ -7,12 +10,31 @@ class UploadInitRequest(BaseModel):
     file_size: int
     folder: Optional[str] = None
     bucket: str
+    multipart: bool = False
+
+class UploadPartUrl(BaseModel):
+    part_number: int
+    url: str
 
 class UploadInitResponse(BaseModel):
-    upload_url: str
+    upload_url: Optional[str] = None  # Single PUT; unset for multipart uploads
     object_key: str
     final_url: str
     expires_in: int
+    # Multipart uploads only
+    upload_id: Optional[str] = None
+    part_size: Optional[int] = None
+    parts: Optional[List[UploadPartUrl]] = None
+
+class UploadInitBatchRequest(BaseModel):
+    items: List[UploadInitRequest]
+
+class UploadInitBatchResponse(BaseModel):
+    items: List[UploadInitResponse]
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
 
 class UploadCompleteRequest(BaseModel):
     object_key: str
@@ -20,6 +42,10 @@ class UploadCompleteRequest(BaseModel):
     file_type: str
     bucket: str
     optimize: bool = True
+    content_hash: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$") # Hex SHA-256, enables dedup of multipart uploads
+    # Multipart uploads only
+    upload_id: Optional[str] = None
+    parts: Optional[List[CompletedPart]] = None
 
 class UploadCompleteResponse(BaseModel):
     object_key: str
@@ -27,6 +53,28 @@ class UploadCompleteResponse(BaseModel):
     mime: str
     size: int
 
+class UploadCompleteBatchRequest(BaseModel):
+    items: List[UploadCompleteRequest]
+
+class UploadCompleteBatchItem(BaseModel):
+    object_key: str
+    status: str  # completed, failed
+    final_url: Optional[str] = None
+    mime: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+class UploadCompleteBatchResponse(BaseModel):
+    items: List[UploadCompleteBatchItem]
+
+class UploadAbortRequest(BaseModel):
+    object_key: str
+    bucket: str
+    upload_id: str
+
+class UploadAbortResponse(BaseModel):
+    status: str
+
 class FileDeleteRequest(BaseModel):
     object_key: str
     bucket: str
@@ -37,8 +85,24 @@ class FileDeleteResponse(BaseModel):
 class FileUrlRequest(BaseModel):
     object_key: str
     bucket: str
-    expires_in: Optional[int] = 3600  # 1 hour default
+    # Seconds; SigV4 allows at most 7 days
+    expires_in: int = Field(3600, ge=1, le=604800)
 
 class FileUrlResponse(BaseModel):
     url: str
     expires_in: int
+
+class FileListItem(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    bucket_name: str
+    object_key: str
+    size: int
+    content_type: str
+    status: str = "pending"
+    created_at: datetime
+    optimized_version: Optional[str] = None
+    progress: Optional[float] = None
+
+class FileListResponse(BaseModel):
+    items: List[FileListItem]
+    next_cursor: Optional[str] = None # Pass as `cursor` for the next page; None on the last page
@@ -0,0 +1,142 @@
+"""
+Write coalescing for the worker's file status updates.
+
+Jobs record their status, size, progress and outputs with `$set` updates.
+Issued one by one they become a storm of single-document writes under a
+stream of small images, so they are buffered here instead and written as
+one unordered bulk_write once `max_ops` files are pending or every
+`interval` seconds, whichever comes first.
+
+Updates to the same key are merged (later fields win) into a single
+operation. Because of that, the order of writes to one file survives the
+unordered bulk, and a burst of progress updates costs one write.
+
+Work whose results are among the pending updates (a finished job) is
+acknowledged with `ack` rather than settled directly: the item is held
+until a flush has written everything that was pending when it was acked,
+and is then handed to `on_flush` together with the others that flush
+covered, so they can be settled in bulk too.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+
+from app.core.metrics import DEPENDENCY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateBatcher:
+    def __init__(self, collection, max_ops: int = 500, interval: float = 1.0,
+                 on_flush: Optional[Callable[[list], None]] = None):
+        self.collection = collection
+        self.max_ops = max_ops
+        self.interval = interval
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        # Serializes bulk writes so a retry can't overtake a newer flush
+        self._flush_lock = threading.Lock()
+        self._pending: dict = {}
+        self._acked: list = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.writes = 0
+
+    def set(self, key, query: dict, fields: dict):
+        """Queue `{"$set": fields}` on `query`; `key` identifies the target (e.g. the file id)"""
+        with self._lock:
+            if key in self._pending:
+                self._pending[key][1].update(fields)
+            else:
+                self._pending[key] = (query, dict(fields))
+            full = len(self._pending) >= self.max_ops
+        self._ensure_started()
+        # After close() nothing flushes on a timer any more
+        if full or self._stop.is_set():
+            self.flush()
+
+    def ack(self, item):
+        """Hold `item` until everything pending now is written, then pass it to `on_flush`"""
+        with self._lock:
+            self._acked.append(item)
+        self._ensure_started()
+        if self._stop.is_set():
+            self.flush()
+
+    def flush(self, key=None) -> bool:
+        """Write everything pending now; with `key`, only if that target has pending fields.
+
+        Returns False when the write failed and the updates were requeued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if key is not None and key not in self._pending:
+                    return True
+                if not self._pending and not self._acked:
+                    return True
+                batch, self._pending = self._pending, {}
+                acked, self._acked = self._acked, []
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Nothing is known to be written: requeue under anything newer
+                    logger.warning("Flush of %d batched writes failed, retrying: %s", len(batch), e)
+                    with self._lock:
+                        for pending_key, (query, fields) in batch.items():
+                            newer = self._pending.get(pending_key)
+                            self._pending[pending_key] = (query, {**fields, **(newer[1] if newer else {})})
+                        self._acked[:0] = acked
+                    return False
+            if acked and self.on_flush:
+                try:
+                    self.on_flush(acked)
+                except Exception as e:
+                    # Their updates are written; a job left unsettled is retried after its lease
+                    logger.error("Settling %d acknowledged items failed: %s", len(acked), e)
+            return True
+
+    def _write(self, batch: dict):
+        """Apply a batch with one unordered bulk_write; raises when nothing is known to be written"""
+        ops = [UpdateMany(query, {"$set": fields}) for query, fields in batch.values()]
+        start = time.perf_counter()
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # The other operations were applied; these failed for good (e.g. validation)
+            logger.error("%d of %d batched writes failed: %s", len(e.details.get("writeErrors", [])), len(ops), e)
+        finally:
+            DEPENDENCY_LATENCY.labels("mongo", f"{self.collection.name}_bulk_update").observe(time.perf_counter() - start)
+        self.flushes += 1
+        self.writes += len(ops)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self._stop.is_set():
+                    self._thread = threading.Thread(target=self._run, name="update-batcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self, attempts: int = 4, backoff: float = 0.5):
+        """Stop the timer and write whatever is still pending, retrying a failed write with backoff"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for attempt in range(attempts):
+            if self.flush():
+                return
+            if attempt + 1 < attempts:
+                time.sleep(backoff * 2 ** attempt)
+        with self._lock:
+            logger.error("Gave up on %d batched writes (%d acknowledged items) after %d attempts",
+                         len(self._pending), len(self._acked), attempts)
@@ -0,0 +1,133 @@
+"""
+Minimal clamd client that streams INSTREAM data over pooled sessions.
+
+Each pooled connection holds a clamd IDSESSION open, so back-to-back scans
+reuse one TCP connection. Data is forwarded chunk by chunk from any object
+with a `read(n)` method (e.g. a MinIO response), never buffered in full.
+"""
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+
+class ClamdError(Exception):
+    pass
+
+
+class ClamdUnavailable(ClamdError):
+    pass
+
+
+class ClamdStreamTooLarge(ClamdError):
+    """The stream exceeds clamd's StreamMaxLength; scanning again won't help"""
+    pass
+
+
+class ClamdConnection:
+    def __init__(self, host: str, port: int, connect_timeout: float, timeout: float):
+        try:
+            self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        except OSError as e:
+            raise ClamdUnavailable(f"Cannot connect to clamd at {host}:{port}: {e}")
+        self.sock.settimeout(timeout)
+        self.sock.sendall(b"zIDSESSION\0")
+        self.last_used = time.monotonic()
+
+    def instream(self, stream, chunk_size: int) -> tuple[str, Optional[str]]:
+        """Scan a stream; returns ("OK", None) or ("FOUND", signature)"""
+        self.sock.sendall(b"zINSTREAM\0")
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                self.sock.sendall(struct.pack("!L", len(chunk)) + chunk)
+            self.sock.sendall(struct.pack("!L", 0))
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # clamd replies and hangs up mid-stream once StreamMaxLength is reached
+            try:
+                reply = self._read_reply()
+            except (ClamdError, OSError):
+                raise ClamdError(f"clamd closed the connection: {e}")
+        else:
+            # Session replies look like "<id>: stream: <result>"
+            reply = self._read_reply()
+        result = reply.split(": ", 1)[-1]
+        if "size limit exceeded" in result:
+            raise ClamdStreamTooLarge(result)
+        if result.endswith("ERROR"):
+            raise ClamdError(result)
+        if not result.startswith("stream: "):
+            raise ClamdError(f"Unexpected clamd reply: {reply}")
+        result = result[len("stream: "):]
+        self.last_used = time.monotonic()
+        if result == "OK":
+            return "OK", None
+        if result.endswith(" FOUND"):
+            return "FOUND", result[:-len(" FOUND")]
+        raise ClamdError(f"Unexpected clamd reply: {reply}")
+
+    def _read_reply(self) -> str:
+        data = b""
+        while not data.endswith(b"\0"):
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ClamdError("clamd closed the connection")
+            data += chunk
+        return data[:-1].decode(errors="replace").strip()
+
+    def close(self):
+        try:
+            self.sock.sendall(b"zEND\0")
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ClamdPool:
+    """Bounded pool of clamd sessions; `size` also caps concurrent scans."""
+
+    def __init__(self, host: str, port: int, size: int = 4, connect_timeout: float = 5,
+                 timeout: float = 120, idle_timeout: float = 25, chunk_size: int = 64 * 1024):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        # Stay below clamd's IdleTimeout so we never reuse a session it dropped
+        self.idle_timeout = idle_timeout
+        self.chunk_size = chunk_size
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _acquire(self) -> ClamdConnection:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if now - conn.last_used < self.idle_timeout:
+                    return conn
+                conn.close()
+        return ClamdConnection(self.host, self.port, self.connect_timeout, self.timeout)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._acquire()
+            try:
+                yield conn
+            except BaseException:
+                # Session state is unknown after a failure; never reuse it
+                conn.close()
+                raise
+            with self._lock:
+                self._idle.append(conn)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
@@ -0,0 +1,67 @@
+"""
+Reference-counted content deduplication.
+
+Each distinct content hash within a (project, bucket) maps to one `blobs`
+document naming the physical object that holds it. Files with the same
+hash point at that object through `File.storage_key`; the object is only
+removed from MinIO when the last reference is released.
+"""
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def content_hash_for(client_sha256: Optional[str], etag: Optional[str]) -> Optional[str]:
+    """Prefer the client's SHA-256; otherwise a single-part ETag is the object's MD5"""
+    if client_sha256:
+        return f"sha256:{client_sha256.lower()}"
+    etag = (etag or "").strip('"')
+    if etag and "-" not in etag:
+        return f"md5:{etag}"
+    return None
+
+
+async def acquire_content(db, project_id: str, bucket_name: str, content_hash: str,
+                          object_key: str, file_id: str, size: int) -> dict:
+    """Take a reference on the blob for `content_hash`, creating it from `object_key` if new.
+
+    `file_id` is the file whose processing jobs run for this content; its
+    duplicates mirror that file's status through `File.source_file_id`.
+    """
+    query = {"project_id": project_id, "bucket_name": bucket_name, "content_hash": content_hash}
+    try:
+        return await db.blobs.find_one_and_update(
+            query,
+            {
+                "$inc": {"ref_count": 1},
+                "$setOnInsert": {
+                    "object_key": object_key,
+                    "file_id": file_id,
+                    "size": size,
+                    "created_at": datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Concurrent first upload of the same content created it
+        return await db.blobs.find_one_and_update(
+            query, {"$inc": {"ref_count": 1}}, return_document=ReturnDocument.AFTER
+        )
+
+
+async def release_content(db, project_id: str, bucket_name: str, content_hash: str) -> Optional[str]:
+    """Drop a reference; returns the physical object key once nothing points at it"""
+    blob = await db.blobs.find_one_and_update(
+        {"project_id": project_id, "bucket_name": bucket_name, "content_hash": content_hash},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob or blob["ref_count"] > 0:
+        return None
+    # Guarded so a reference taken in the meantime keeps the object alive
+    result = await db.blobs.delete_one({"_id": blob["_id"], "ref_count": {"$lte": 0}})
+    return blob["object_key"] if result.deleted_count else None
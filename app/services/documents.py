@@ -0,0 +1,85 @@
+"""
+PDF sanitization for uploaded documents.
+
+Works on file paths so it can run in the CPU process pool. The reader is
+given an open file rather than a path (pypdf reads a path fully into
+memory), so objects are parsed lazily from disk and the rewrite streams
+straight to the output file.
+"""
+import os
+from typing import Optional
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject
+
+
+def _is_javascript(action) -> bool:
+    action = action.get_object() if action is not None else None
+    return isinstance(action, DictionaryObject) and action.get("/S") == "/JavaScript"
+
+
+def sanitize_reasons(reader: PdfReader) -> set[str]:
+    """What a rewrite would strip: "metadata", "javascript" and/or "embedded_files".
+
+    Only dictionaries are inspected (no content streams are decoded), so
+    this is cheap even for long scanned documents.
+    """
+    reasons = set()
+    info = reader.trailer.get("/Info")
+    root = reader.trailer["/Root"].get_object()
+    if (info is not None and len(info.get_object()) > 0) or "/Metadata" in root:
+        reasons.add("metadata")
+
+    names = root.get("/Names")
+    names = names.get_object() if names is not None else {}
+    if "/JavaScript" in names or "/AA" in root or _is_javascript(root.get("/OpenAction")):
+        reasons.add("javascript")
+    if "/EmbeddedFiles" in names or "/AF" in root:
+        reasons.add("embedded_files")
+
+    for page in reader.pages:
+        if "/AA" in page:
+            reasons.add("javascript")
+        for annot in page.get("/Annots") or []:
+            annot = annot.get_object()
+            if annot.get("/Subtype") == "/FileAttachment":
+                reasons.add("embedded_files")
+            if "/AA" in annot or _is_javascript(annot.get("/A")):
+                reasons.add("javascript")
+    return reasons
+
+
+def _strip_page(page):
+    page.pop("/AA", None)
+    if "/Annots" not in page:
+        return
+    kept = ArrayObject()
+    for ref in page["/Annots"]:
+        annot = ref.get_object()
+        if annot.get("/Subtype") == "/FileAttachment" or _is_javascript(annot.get("/A")):
+            continue
+        annot.pop("/AA", None)
+        kept.append(ref)
+    page[NameObject("/Annots")] = kept
+
+
+def sanitize_pdf_file(input_path: str, output_path: str) -> Optional[int]:
+    """Rewrite a PDF without metadata, JavaScript or embedded files.
+
+    Returns the output size in bytes, or None when there is nothing to strip
+    and the original can be kept as is.
+    """
+    with open(input_path, "rb") as f:
+        reader = PdfReader(f)
+        if not sanitize_reasons(reader):
+            return None
+
+        # Pages only: the document catalog (names tree, open action, XMP) is not carried over
+        writer = PdfWriter()
+        for page in reader.pages:
+            _strip_page(writer.add_page(page))
+        writer.metadata = None
+
+        with open(output_path, "wb") as out:
+            writer.write(out)
+    return os.path.getsize(output_path)
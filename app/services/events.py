@@ -0,0 +1,216 @@
+"""
+Metadata sync driven by MinIO bucket notifications.
+
+MinIO posts s3:ObjectCreated / s3:ObjectRemoved events to the webhook in
+app/api/events.py, which only records them in the `object_events`
+collection. The applier loop then leases settled events in batches,
+collapses them to the latest event per object and applies each bucket's
+changes to `files` with one bulk_write, queueing processing jobs for
+objects that were never completed through the API.
+
+Events wait EVENT_SETTLE_SECONDS before they are applied so that a normal
+upload is recorded by complete_upload first (with its content type and
+dedup information); the event then only confirms what is already there.
+"""
+import asyncio
+import functools
+import logging
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import unquote_plus
+
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.models.file import File
+from app.models.project import Bucket
+from app.services.queue import enqueue_jobs, processing_job
+from app.services.sync import is_generated
+from app.services.usage import add_usage
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+REMOVED = "removed"
+
+
+def parse_records(payload: dict) -> list[dict]:
+    """Turn a MinIO notification payload into `object_events` documents"""
+    now = datetime.utcnow()
+    events = []
+    for record in payload.get("Records") or []:
+        name = record.get("eventName", "")
+        if name.startswith("s3:ObjectCreated:"):
+            kind = CREATED
+        elif name.startswith("s3:ObjectRemoved:"):
+            kind = REMOVED
+        else:
+            continue
+        s3 = record.get("s3", {})
+        obj = s3.get("object", {})
+        # Keys arrive URL-encoded
+        key = unquote_plus(obj.get("key", ""))
+        if not key or is_generated(key):
+            continue
+        events.append({
+            "bucket": s3.get("bucket", {}).get("name"),
+            "key": key,
+            "event": kind,
+            "size": obj.get("size") or 0,
+            "content_type": obj.get("contentType") or "application/octet-stream",
+            "received_at": now,
+            "lease": None,
+            "lease_until": None,
+        })
+    return events
+
+
+async def _claim(db, lease: str) -> list[dict]:
+    now = datetime.utcnow()
+    claimable = {
+        "received_at": {"$lte": now - timedelta(seconds=settings.EVENT_SETTLE_SECONDS)},
+        # Unleased, or leased by an applier that died mid-batch
+        "$or": [{"lease_until": None}, {"lease_until": {"$lte": now}}],
+    }
+    candidates = await db.object_events.find(claimable, {"_id": 1}).sort("_id", 1).to_list(settings.EVENT_BATCH_SIZE)
+    if not candidates:
+        return []
+    await db.object_events.update_many(
+        {"_id": {"$in": [event["_id"] for event in candidates]}, **claimable},
+        {"$set": {"lease": lease, "lease_until": now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT)}}
+    )
+    # Other API processes may have won some of them
+    return await db.object_events.find({"lease": lease}).sort("_id", 1).to_list(None)
+
+
+async def _apply_bucket(db, bucket: Bucket, events: list[dict]) -> list:
+    """Apply one bucket's latest events; returns the processing jobs to queue"""
+    scope = {"project_id": bucket.project_id, "bucket_name": bucket.name}
+    created = {event["key"]: event for event in events if event["event"] == CREATED}
+    removed = [event["key"] for event in events if event["event"] == REMOVED]
+    ops, jobs = [], []
+    # Position of each insert in `ops` -> its job and size
+    inserts = {}
+    files_delta, size_delta = 0, 0
+
+    if created:
+        keys = list(created)
+        known = {}
+        async for doc in db.files.find(
+            {**scope, "$or": [{"object_key": {"$in": keys}}, {"storage_key": {"$in": keys}}]},
+            {"object_key": 1, "storage_key": 1, "source_file_id": 1, "size": 1}
+        ):
+            # Duplicates have no object of their own, but do hold their storage_key
+            if not doc.get("source_file_id"):
+                known.setdefault(doc["object_key"], []).append(doc)
+            if doc.get("storage_key"):
+                known.setdefault(doc["storage_key"], [])
+
+        for key, event in created.items():
+            if key in known:
+                # Overwritten in place (e.g. by the optimizer): keep the size current
+                for doc in known[key]:
+                    if doc["size"] != event["size"]:
+                        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"size": event["size"]}}))
+                        size_delta += event["size"] - doc["size"]
+                continue
+
+            # Uploaded without complete_upload
+            file_id = ObjectId()
+            new_file = File(
+                project_id=bucket.project_id,
+                bucket_name=bucket.name,
+                object_key=key,
+                size=event["size"],
+                content_type=event["content_type"]
+            )
+            inserts[len(ops)] = (processing_job(bucket, key, event["content_type"], str(file_id)), event["size"])
+            ops.append(InsertOne({"_id": file_id, **new_file.model_dump(by_alias=True, exclude={"id"})}))
+
+    if removed:
+        removed_filter = {**scope, "$or": [
+            {"object_key": {"$in": removed}, "source_file_id": None},
+            {"storage_key": {"$in": removed}}
+        ]}
+        async for doc in db.files.find(removed_filter, {"size": 1, "derived_size": 1}):
+            files_delta -= 1
+            size_delta -= doc["size"] + doc.get("derived_size", 0)
+        ops.append(DeleteMany(removed_filter))
+        await db.blobs.delete_many({**scope, "object_key": {"$in": removed}})
+
+    if ops:
+        recorded = set()
+        try:
+            await db.files.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # complete_upload recorded these in the meantime, with their jobs
+            recorded = {error["index"] for error in errors}
+        for index, (job, size) in inserts.items():
+            if index not in recorded:
+                jobs.append(job)
+                files_delta += 1
+                size_delta += size
+        await add_usage(db, bucket.project_id, files=files_delta, size=size_delta)
+    return jobs
+
+
+async def _dispatch(db, jobs: list):
+    jobs = [job for job in jobs if job]
+    if settings.JOB_QUEUE_BACKEND == "local":
+        # Worker tasks are plain functions; run them on the default thread pool
+        from app.worker import TASKS
+        loop = asyncio.get_running_loop()
+        for task, kwargs in jobs:
+            loop.run_in_executor(None, functools.partial(TASKS[task], **kwargs))
+    else:
+        await enqueue_jobs(db, jobs)
+
+
+async def apply_object_events(db) -> int:
+    """Apply one batch of settled events; returns how many were consumed"""
+    lease = uuid.uuid4().hex
+    events = await _claim(db, lease)
+    if not events:
+        return 0
+
+    # Latest event per object wins (e.g. created then removed)
+    latest = {}
+    for event in events:
+        latest[(event["bucket"], event["key"])] = event
+    by_bucket = {}
+    for (physical_name, _), event in latest.items():
+        by_bucket.setdefault(physical_name, []).append(event)
+
+    # Events for buckets we don't know (e.g. a deleted project) are dropped
+    buckets = await db.buckets.find({"physical_name": {"$in": list(by_bucket)}}).to_list(None)
+    failed = []
+    for bucket_data in buckets:
+        bucket = Bucket(**bucket_data)
+        # Each bucket's jobs are queued as soon as its files are written, so a
+        # later bucket failing can't strand them
+        try:
+            await _dispatch(db, await _apply_bucket(db, bucket, by_bucket[bucket.physical_name]))
+        except Exception:
+            logger.exception("Applying events of bucket %s failed", bucket.physical_name)
+            failed.append(bucket.physical_name)
+
+    # A failed bucket's events stay leased and are claimed again once the lease expires
+    await db.object_events.delete_many({"lease": lease, "bucket": {"$nin": failed}})
+    return len(events)
+
+
+async def run_event_applier(db):
+    """Apply recorded bucket notifications until cancelled"""
+    while True:
+        try:
+            if await apply_object_events(db) >= settings.EVENT_BATCH_SIZE:
+                # More are waiting; keep draining
+                continue
+        except Exception:
+            logger.exception("Event batch failed")
+        await asyncio.sleep(settings.EVENT_POLL_INTERVAL)
@@ -0,0 +1,190 @@
+"""
+Pillow pipeline for uploaded images.
+
+Functions here take file paths rather than bytes so they can run in a
+ProcessPoolExecutor without pickling image data between processes.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+MAX_WIDTH = 1920
+
+VARIANT_PREFIX = "_variants/"
+FORMAT_EXTENSIONS = {"webp": "webp", "avif": "avif", "jpeg": "jpg", "png": "png"}
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg", "png": "image/png"}
+
+# Recently served /img renditions: (physical bucket, derived key) -> (content, etag)
+variant_cache = TTLCache(
+    maxsize=settings.IMAGE_RESIZE_CACHE_SIZE,
+    ttl=settings.IMAGE_RESIZE_CACHE_TTL,
+    maxbytes=settings.IMAGE_RESIZE_CACHE_MAX_BYTES,
+    sizeof=lambda entry: len(entry[0]),
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_flight = None
+
+
+def open_image(input_path: str) -> Image.Image:
+    """Open an image lazily (header only), rejecting decompression bombs up front"""
+    img = Image.open(input_path)
+    if img.width * img.height > settings.IMAGE_MAX_PIXELS:
+        img.close()
+        raise ValueError(
+            f"Image too large: {img.width}x{img.height} exceeds {settings.IMAGE_MAX_PIXELS} pixels"
+        )
+    return img
+
+
+def _normalize_mode(img: Image.Image) -> Image.Image:
+    """Convert to L, LA, RGB or RGBA, which every resample filter and output format accepts"""
+    if img.mode in ("L", "LA", "RGB", "RGBA"):
+        return img
+    if img.mode.startswith("I"):
+        # 16-bit greyscale: scale into 8 bits rather than clipping to white
+        return img.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+    if img.mode in ("1", "F"):
+        return img.convert("L")
+    if img.mode in ("PA", "RGBa", "La") or "transparency" in img.info:
+        return img.convert("LA" if img.mode == "La" else "RGBA")
+    # P, CMYK, YCbCr, LAB, HSV
+    return img.convert("RGB")
+
+
+def downscale(img: Image.Image, max_width: int, max_height: int = None) -> Image.Image:
+    """Shrink to fit `max_width` (and `max_height`) without decoding at full resolution.
+
+    JPEGs are decoded as a DCT-scaled draft near the target size, and
+    resize() box-reduces by integer factors before the final LANCZOS pass,
+    so peak memory tracks the output size rather than the source. The
+    bounding dimension comes out exact (1280 stays 1280, where thumbnail()
+    could round it down).
+    """
+    scale = min(
+        max_width / img.width if max_width else 1,
+        max_height / img.height if max_height else 1
+    )
+    target = None
+    if scale < 1:
+        # Both bounds must be tight, or the JPEG draft can't scale
+        target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        # JPEG only (no-op elsewhere): decode at the smallest DCT scale that
+        # still covers the target size
+        img.draft(None, target)
+    # After the draft, which only applies before the first decode. Palette
+    # images would otherwise resize with NEAREST; CMYK and 16-bit modes
+    # can't be resampled or saved as WebP/PNG.
+    img = _normalize_mode(img)
+    if target:
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def optimize_image_file(input_path: str, output_path: str) -> int:
+    """Re-encode an image as WebP (max 1920px wide); returns the output size in bytes"""
+    with open_image(input_path) as img:
+        img = downscale(img, MAX_WIDTH)
+
+        # Convert to RGB if necessary (e.g. for PNG to JPEG/WebP)
+        if img.mode == "RGBA":
+            img = img.convert("RGB")
+
+        # Save as WebP
+        img.save(output_path, format="WEBP", quality=80, optimize=True)
+    return os.path.getsize(output_path)
+
+
+def render_resized_file(input_path: str, output_path: str, width: int, height: int, fmt: str, quality: int) -> int:
+    """Fit an image inside width x height (either may be None) and encode it; returns the size in bytes"""
+    with open_image(input_path) as img:
+        img = downscale(img, width, height)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(output_path, format=fmt.upper(), quality=quality)
+    return os.path.getsize(output_path)
+
+
+def variant_key(object_key: str, name: str, fmt: str) -> str:
+    """Derived object key for a rendition; kept under a prefix that sync skips"""
+    return f"{VARIANT_PREFIX}{object_key}/{name}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def generate_variants_file(input_path: str, output_dir: str, specs: list[dict]) -> list[dict]:
+    """Render every variant from a single decode, largest first.
+
+    Each rendition is downscaled from the previous one, so the source is
+    decoded once (as a JPEG draft near the largest width) and every later
+    step only touches an already-small image.
+    """
+    results = []
+    ordered = sorted(specs, key=lambda spec: spec["width"], reverse=True)
+    with open_image(input_path) as img:
+        current = downscale(img, ordered[0]["width"])
+        for spec in ordered:
+            current = downscale(current, spec["width"])
+            out = current
+            if spec["format"] == "jpeg" and out.mode not in ("RGB", "L"):
+                out = out.convert("RGB")
+
+            output_path = os.path.join(output_dir, f"{spec['name']}.{FORMAT_EXTENSIONS[spec['format']]}")
+            out.save(output_path, format=spec["format"].upper(), quality=spec["quality"])
+            results.append({
+                "name": spec["name"],
+                "path": output_path,
+                "format": spec["format"],
+                "width": out.width,
+                "height": out.height,
+                "size": os.path.getsize(output_path),
+            })
+    return results
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool, _in_flight
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.IMAGE_PROCESS_WORKERS or os.cpu_count() or 1
+            # Never fork: the parent already runs worker, Motor/PyMongo and executor threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _in_flight = threading.BoundedSemaphore(settings.IMAGE_MAX_IN_FLIGHT or workers * 2)
+        return _pool
+
+
+def run_in_pool(func, *args):
+    """Run `func` in the image process pool, blocking while too many jobs are in flight"""
+    pool = get_image_pool()
+    with _in_flight:
+        try:
+            return pool.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A child died (e.g. OOM-killed); a broken executor rejects every
+            # later submit, so drop it and let the next call start a new one.
+            # This job fails: retrying the same input would likely kill it again.
+            _discard_pool(pool)
+            raise
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
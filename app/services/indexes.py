@@ -0,0 +1,229 @@
+"""
+Declarative index registry, reconciled when the API starts.
+
+INDEXES lists every index the queries in this codebase rely on. At startup
+`reconcile_indexes` compares it with what each collection actually has:
+missing indexes are built (one at a time, so a failing unique build does
+not hold the others back), indexes whose options differ from the registry
+are reported as drift, indexes listed in RETIRED_INDEXES are dropped, and
+any other index the registry doesn't know is listed.
+It then explains each HOT_QUERIES entry and warns about any plan that falls
+back to a collection scan or sorts in memory.
+
+Index names are left to MongoDB's default (`field_1_other_-1`), so indexes
+created by the old create_indexes.py script are recognised as is.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.services.listing import listing_query
+
+logger = logging.getLogger(__name__)
+
+# Options compared when checking an existing index against the registry
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+INDEXES = {
+    "projects": [
+        # API key authentication
+        IndexModel([("api_key", ASCENDING)], unique=True),
+        IndexModel([("name", ASCENDING)], unique=True),
+    ],
+    "buckets": [
+        # Logical bucket name per project (backs the upsert in get_or_create_bucket)
+        IndexModel([("project_id", ASCENDING), ("name", ASCENDING)], unique=True),
+        # Bucket notifications arrive with the physical name
+        IndexModel([("physical_name", ASCENDING)]),
+    ],
+    "files": [
+        # Usage repair: covered $sum of size and derived_size
+        IndexModel([("project_id", ASCENDING), ("size", ASCENDING), ("derived_size", ASCENDING)]),
+        # File lookups by key (delete, /file/url, /img) and key-ordered sync scans;
+        # unique so concurrent completes and object events record an upload once
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("object_key", ASCENDING)], unique=True),
+        # Listings: newest-first keyset pagination, one index per filter shape
+        # (app/services/listing.py); object_key lets prefix filters run on the keys
+        IndexModel([("project_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING),
+                    ("object_key", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("created_at", DESCENDING),
+                    ("_id", DESCENDING), ("object_key", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("content_type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("content_family", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("status", ASCENDING),
+                    ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("content_family", ASCENDING),
+                    ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("project_id", ASCENDING), ("status", ASCENDING), ("content_family", ASCENDING),
+                    ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Deduplication: duplicates by source file, and files holding a shared object
+        IndexModel([("source_file_id", ASCENDING)], sparse=True),
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("storage_key", ASCENDING)], sparse=True),
+    ],
+    "blobs": [
+        IndexModel([("project_id", ASCENDING), ("bucket_name", ASCENDING), ("content_hash", ASCENDING)], unique=True),
+    ],
+    "object_events": [
+        # Settled, unleased events; then the events of one lease
+        IndexModel([("received_at", ASCENDING), ("lease_until", ASCENDING)]),
+        IndexModel([("lease", ASCENDING)]),
+    ],
+    "multipart_uploads": [
+        # Janitor scan for stale uploads, and removal on complete/abort
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("upload_id", ASCENDING)]),
+    ],
+    "jobs": [
+        # Claim order, and expiry of finished jobs after 7 days
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+# Indexes earlier versions created that the registry has replaced; dropped when found
+RETIRED_INDEXES = {
+    # Prefixes of the compound (project_id, ...) indexes
+    "buckets": ["project_id_1"],
+    "files": ["project_id_1", "project_id_1_size_1",
+              # Listing index without object_key, which prefix filters needed
+              "project_id_1_created_at_-1__id_-1"],
+}
+
+# (label, collection, filter, sort) in the shape the code issues them;
+# the values only need the right types
+_ID = "000000000000000000000000"
+HOT_QUERIES = [
+    ("authenticate", "projects", {"api_key": "key", "deleted_at": None}, None),
+    ("bucket by name", "buckets", {"project_id": _ID, "name": "bucket"}, None),
+    ("bucket by physical name", "buckets", {"physical_name": "bucket"}, None),
+    ("file by key", "files", {"project_id": _ID, "bucket_name": "bucket", "object_key": "key"}, None),
+    ("file by storage key", "files", {"project_id": _ID, "bucket_name": "bucket", "storage_key": "key"}, None),
+    # Every filter combination list_files accepts
+    *((label, "files", listing_query(_ID, **filters), [("created_at", -1), ("_id", -1)]) for label, filters in (
+        ("list files", {}),
+        ("list files by prefix", {"prefix": "uploads/"}),
+        ("list files by bucket", {"bucket": "bucket"}),
+        ("list files by bucket and prefix", {"bucket": "bucket", "prefix": "uploads/"}),
+        ("list files by status", {"status": "ready"}),
+        ("list files by type", {"content_type": "image/png"}),
+        ("list files by type family", {"content_type": "image/"}),
+        ("list files by bucket and status", {"bucket": "bucket", "status": "ready"}),
+        ("list files by bucket and type family", {"bucket": "bucket", "content_type": "image/"}),
+        ("list files by status and type", {"status": "ready", "content_type": "image/png"}),
+    )),
+    ("sync scan", "files", {"project_id": _ID, "bucket_name": "bucket", "source_file_id": None}, [("object_key", 1)]),
+    ("blob by hash", "blobs", {"project_id": _ID, "bucket_name": "bucket", "content_hash": "hash"}, None),
+    ("claim job", "jobs", {"status": "queued", "available_at": {"$lte": datetime(2000, 1, 1)}}, [("available_at", 1)]),
+    ("claim events", "object_events", {"received_at": {"$lte": datetime(2000, 1, 1)}, "lease_until": None}, [("_id", 1)]),
+]
+
+
+def _normalize(spec: dict) -> dict:
+    """Key and compared options of an index, comparable across registry and server"""
+    key = [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+           for field, direction in spec["key"].items()]
+    options = {option: spec[option] for option in COMPARED_OPTIONS if spec.get(option) not in (None, False)}
+    return {"key": key, **options}
+
+
+async def _reconcile_collection(db, name: str, models: list[IndexModel], report: dict):
+    existing = {}
+    async for index in db[name].list_indexes():
+        existing[index["name"]] = _normalize(index)
+
+    for model in models:
+        wanted = model.document
+        spec = _normalize(wanted)
+        current = existing.pop(wanted["name"], None)
+        if current == spec:
+            continue
+        if current is not None:
+            report["drifted"].append(f"{name}.{wanted['name']}")
+            logger.warning("Index %s.%s differs from the registry: has %s, want %s", name, wanted["name"], current, spec)
+            if not settings.INDEX_REPAIR_DRIFT:
+                continue
+            await db[name].drop_index(wanted["name"])
+        try:
+            await db[name].create_indexes([model])
+            report["created"].append(f"{name}.{wanted['name']}")
+            logger.info("Created index %s.%s", name, wanted["name"])
+        except OperationFailure as e:
+            # e.g. duplicates blocking a unique index; the others still get built
+            report["failed"].append(f"{name}.{wanted['name']}")
+            logger.error("Could not create index %s.%s: %s", name, wanted["name"], e)
+
+    for index_name in existing:
+        if index_name in RETIRED_INDEXES.get(name, []):
+            await db[name].drop_index(index_name)
+            report["dropped"].append(f"{name}.{index_name}")
+            logger.info("Dropped retired index %s.%s", name, index_name)
+        elif index_name != "_id_":
+            report["unmanaged"].append(f"{name}.{index_name}")
+            logger.info("Index %s.%s is not in the registry", name, index_name)
+
+
+def _plan_stages(plan) -> list[dict]:
+    """Every stage of an explain plan, classic or slot-based"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan)
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def explain_hot_queries(db) -> tuple[list[str], list[str]]:
+    """Log the winning plan of each hot query; returns those doing a collection scan, and an in-memory sort"""
+    collscans, sorts = [], []
+    for label, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = await cursor.explain()
+        except OperationFailure as e:
+            logger.warning("Explain failed for '%s': %s", label, e)
+            continue
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        used = [stage["indexName"] for stage in stages if stage.get("indexName")]
+        if any(stage["stage"] == "COLLSCAN" for stage in stages):
+            collscans.append(label)
+            logger.warning("'%s' on %s does a collection scan", label, collection)
+        elif any(stage["stage"] == "SORT" for stage in stages):
+            sorts.append(label)
+            logger.warning("'%s' on %s sorts in memory (uses %s)", label, collection, ", ".join(used) or "no index")
+        elif used:
+            logger.info("'%s' on %s uses %s", label, collection, ", ".join(used))
+        else:
+            # e.g. EOF on a collection that doesn't exist yet
+            logger.info("'%s' on %s: %s", label, collection, stages[0]["stage"] if stages else "no plan")
+    return collscans, sorts
+
+
+async def reconcile_indexes(db, explain: Optional[bool] = None) -> dict:
+    """Bring every registered collection in line with INDEXES; returns what changed"""
+    report = {"created": [], "dropped": [], "drifted": [], "failed": [], "unmanaged": [], "collscans": [], "sorts": []}
+    for name, models in INDEXES.items():
+        try:
+            await _reconcile_collection(db, name, models, report)
+        except Exception:
+            logger.exception("Reconciling indexes of %s failed", name)
+            report["failed"].append(name)
+
+    if settings.INDEX_EXPLAIN_HOT_QUERIES if explain is None else explain:
+        report["collscans"], report["sorts"] = await explain_hot_queries(db)
+    logger.info(
+        "Indexes reconciled: %d created, %d dropped, %d drifted, %d failed, %d collection scans, %d in-memory sorts",
+        len(report["created"]), len(report["dropped"]), len(report["drifted"]), len(report["failed"]),
+        len(report["collscans"]), len(report["sorts"])
+    )
+    return report
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from minio.error import S3Error
+
+from app.core.config import settings
+from app.services.storage import storage_service
+
+logger = logging.getLogger(__name__)
+
+GONE_ERRORS = ("NoSuchUpload", "NoSuchBucket")
+
+
+async def abort_stale_uploads(db) -> dict:
+    """Abort multipart uploads started more than MULTIPART_STALE_AFTER ago and never completed.
+
+    Works from the `multipart_uploads` records written at init rather than
+    listing uploads in MinIO, which only lists them for an exact key prefix.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.MULTIPART_STALE_AFTER)
+    stats = {"aborted": 0, "errors": []}
+
+    async for upload in db.multipart_uploads.find({"created_at": {"$lt": cutoff}}):
+        try:
+            await storage_service.abort_multipart_upload(upload["bucket"], upload["object_key"], upload["upload_id"])
+            stats["aborted"] += 1
+        except S3Error as e:
+            # Already completed, aborted or gone with its bucket: just forget it
+            if e.code not in GONE_ERRORS:
+                stats["errors"].append(f"{upload['bucket']}/{upload['object_key']}: {str(e)}")
+                continue
+        except Exception as e:
+            stats["errors"].append(f"{upload['bucket']}/{upload['object_key']}: {str(e)}")
+            continue
+        await db.multipart_uploads.delete_one({"_id": upload["_id"]})
+
+    return stats
+
+
+async def run_janitor(db):
+    """Periodically abort stale multipart uploads until cancelled"""
+    while True:
+        await asyncio.sleep(settings.MULTIPART_JANITOR_INTERVAL)
+        try:
+            stats = await abort_stale_uploads(db)
+            if stats["aborted"] or stats["errors"]:
+                logger.info("Aborted %d stale multipart uploads, %d errors", stats["aborted"], len(stats["errors"]))
+        except Exception:
+            logger.exception("Janitor run failed")
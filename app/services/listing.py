@@ -0,0 +1,121 @@
+"""
+Keyset pagination over the `files` collection.
+
+Pages are ordered newest first by (created_at, _id) and the cursor encodes
+the last row returned, so every page is an index seek plus `limit` reads
+however deep it is (no skip). Each filter combination is served by one of
+the compound indexes registered in app/services/indexes.py, and any other
+combination is rejected rather than sorted in memory:
+
+    (project_id, created_at, _id, object_key)                  no filter, prefix
+    (project_id, bucket_name, created_at, _id, object_key)     bucket, bucket + prefix
+    (project_id, status, created_at, _id)                      status
+    (project_id, content_type, created_at, _id)                content type
+    (project_id, content_family, created_at, _id)              type family ("image/")
+    (project_id, bucket_name, status, created_at, _id)         bucket + status
+    (project_id, bucket_name, content_family, created_at, _id) bucket + type
+    (project_id, status, content_family, created_at, _id)      status + type
+
+A type filter always constrains `content_family`, so the combined shapes
+use the family indexes and check an exact content type on the fetched rows.
+"""
+import base64
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+
+from app.core.database import listing_read_preference
+from app.models.file import content_family
+
+logger = logging.getLogger(__name__)
+
+# Filter combinations that have an index (see above)
+INDEXED_FILTERS = {frozenset(shape) for shape in (
+    (), ("prefix",), ("bucket",), ("bucket", "prefix"), ("status",), ("content_type",),
+    ("bucket", "status"), ("bucket", "content_type"), ("status", "content_type"),
+)}
+
+# Only what FileListItem returns
+LIST_PROJECTION = {
+    "bucket_name": 1, "object_key": 1, "size": 1, "content_type": 1,
+    "status": 1, "created_at": 1, "optimized_version": 1, "progress": 1
+}
+
+
+def encode_cursor(created_at: datetime, file_id: ObjectId) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": str(file_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """Raises ValueError for anything that isn't a cursor we issued"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def listing_query(project_id: str, bucket: Optional[str] = None, status: Optional[str] = None,
+                  content_type: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+    """The files filter for a listing; raises ValueError for a combination with no index"""
+    filters = {"bucket": bucket, "status": status, "content_type": content_type, "prefix": prefix}
+    shape = frozenset(name for name, value in filters.items() if value)
+    if shape not in INDEXED_FILTERS:
+        raise ValueError(f"Filtering by {' and '.join(sorted(shape))} together is not supported")
+
+    query = {"project_id": project_id}
+    if bucket:
+        query["bucket_name"] = bucket
+    if status:
+        query["status"] = status
+    if content_type:
+        # "image/" matches every image type
+        query["content_family"] = content_family(content_type)
+        if not content_type.endswith("/"):
+            query["content_type"] = content_type
+    if prefix:
+        query["object_key"] = {"$regex": f"^{re.escape(prefix)}"}
+    return query
+
+
+async def list_files(db, project_id: str, bucket: Optional[str] = None, status: Optional[str] = None,
+                     content_type: Optional[str] = None, prefix: Optional[str] = None,
+                     cursor: Optional[str] = None, limit: int = 50) -> tuple[list[dict], Optional[str]]:
+    """One page of a project's files, newest first; returns (rows, next cursor)"""
+    query = listing_query(project_id, bucket, status, content_type, prefix)
+    if cursor:
+        created_at, file_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": file_id}}
+        ]
+
+    # One extra row tells us whether another page exists
+    files = db.files.with_options(read_preference=listing_read_preference())
+    rows = await files.find(query, LIST_PROJECTION).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["_id"])
+    return rows, next_cursor
+
+
+async def backfill_content_family(db):
+    """Startup: derive `content_family` for files recorded before it existed"""
+    try:
+        result = await db.files.update_many(
+            {"content_family": {"$exists": False}},
+            [{"$set": {"content_family": {"$arrayElemAt": [{"$split": ["$content_type", "/"]}, 0]}}}]
+        )
+        if result.modified_count:
+            logger.info("Set content_family on %d files", result.modified_count)
+    except Exception:
+        logger.exception("Backfilling content_family failed")
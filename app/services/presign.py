@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from app.core.cache import TTLCache
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+# SigV4 caps presigned URLs at 7 days
+MAX_EXPIRY = 604800
+
+
+class Presigner:
+    """Pure-CPU AWS SigV4 query-string presigner for path-style MinIO URLs.
+
+    The region is fixed by configuration (no GetBucketLocation round trip),
+    and the derived signing key is reused for every request on the same
+    (day, region, service).
+    """
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str,
+                 region: str = "us-east-1", secure: bool = True, service: str = "s3"):
+        self.host = endpoint
+        self.scheme = "https" if secure else "http"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self._signing_keys: dict[tuple[str, str, str], bytes] = {}
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        cache_key = (datestamp, self.region, self.service)
+        key = self._signing_keys.get(cache_key)
+        if key is None:
+            key = hmac.new(("AWS4" + self.secret_key).encode(), datestamp.encode(), hashlib.sha256).digest()
+            for part in (self.region, self.service, "aws4_request"):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            # Only today's (and at most yesterday's) key is ever needed
+            if len(self._signing_keys) > 4:
+                self._signing_keys.clear()
+            self._signing_keys[cache_key] = key
+        return key
+
+    def presign(self, method: str, bucket_name: str, object_name: str,
+                expires: int, request_date: datetime = None, query_params: dict = None) -> str:
+        date = request_date or datetime.now(timezone.utc)
+        amz_date = date.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/{self.service}/aws4_request"
+
+        path = quote(f"/{bucket_name}/{object_name}", safe="/~")
+        query = (
+            f"X-Amz-Algorithm={ALGORITHM}"
+            f"&X-Amz-Credential={quote(f'{self.access_key}/{scope}', safe='~')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expires}"
+            f"&X-Amz-SignedHeaders=host"
+        )
+        if query_params:
+            # X-Amz-* sort before any lowercase S3 sub-resource (partNumber, uploadId)
+            query += "".join(
+                f"&{quote(str(k), safe='~')}={quote(str(v), safe='~')}"
+                for k, v in sorted(query_params.items())
+            )
+        canonical_request = (
+            f"{method}\n{path}\n{query}\n"
+            f"host:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+        )
+        string_to_sign = (
+            f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+            f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        )
+        signature = hmac.new(self._signing_key(datestamp), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{self.scheme}://{self.host}{path}?{query}&X-Amz-Signature={signature}"
+
+
+class CachedGetPresigner:
+    """Serves identical GET URLs for a key within a time window.
+
+    Signing every URL at the window start (and extending its lifetime by the
+    window length) keeps each URL valid for at least the requested `expires`
+    while letting repeated requests for hot objects hit the cache.
+    """
+
+    def __init__(self, presigner: Presigner, window: int = 300, maxsize: int = 10000):
+        self.presigner = presigner
+        self.window = window
+        self.cache = TTLCache(maxsize=maxsize, ttl=window)
+
+    def presign_get(self, bucket_name: str, object_name: str, expires: int) -> str:
+        if self.window <= 0 or expires + self.window > MAX_EXPIRY:
+            # Near the cap a window-aligned URL couldn't last `expires` seconds
+            return self.presigner.presign("GET", bucket_name, object_name, expires)
+
+        window_start = int(time.time()) // self.window * self.window
+        cache_key = (bucket_name, object_name, expires, window_start)
+        url = self.cache.get(cache_key)
+        if url is None:
+            url = self.presigner.presign(
+                "GET", bucket_name, object_name, expires + self.window,
+                request_date=datetime.fromtimestamp(window_start, timezone.utc)
+            )
+            self.cache.set(cache_key, url)
+        return url
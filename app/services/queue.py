@@ -0,0 +1,192 @@
+"""
+Durable job queue backed by the `jobs` collection.
+
+The API enqueues with the async Motor database; the standalone worker
+(`python -m app.worker`) claims jobs with a synchronous PyMongo collection.
+A claimed job is leased for JOB_VISIBILITY_TIMEOUT seconds and the worker
+renews the lease while the job runs: if the worker dies, the lease expires
+and another worker picks the job up again, until max_attempts is reached.
+"""
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.models.project import Bucket
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def new_job(task: str, kwargs: dict) -> dict:
+    now = datetime.utcnow()
+    return {
+        "task": task,
+        "kwargs": kwargs,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": settings.JOB_MAX_ATTEMPTS,
+        "available_at": now,
+        "locked_until": None,
+        "lease": None,
+        "last_error": None,
+        "created_at": now,
+        "finished_at": None,
+    }
+
+
+async def enqueue_jobs(db, jobs: list[tuple[str, dict]]):
+    """Persist (task name, kwargs) pairs in a single write"""
+    if not jobs:
+        return
+    await db.jobs.insert_many([new_job(task, kwargs) for task, kwargs in jobs], ordered=False)
+
+
+def processing_job(db_bucket: Bucket, object_key: str, content_type: str, file_id: str,
+                   optimize: bool = True) -> Optional[tuple[str, dict]]:
+    """Pick the post-upload job for a file, as (task name, kwargs), if any"""
+    kwargs = {"bucket_name": db_bucket.physical_name, "object_key": object_key, "file_id": file_id}
+    next_task = None
+
+    # Trigger Image Optimization if applicable
+    if content_type.startswith("image/") and optimize:
+        task_kwargs = dict(kwargs)
+        if db_bucket.image_variants:
+            task_kwargs["variants"] = [variant.model_dump() for variant in db_bucket.image_variants]
+        next_task = {"task": "optimize_image", "kwargs": task_kwargs}
+
+    # Trigger Video Transcoding if applicable
+    elif content_type.startswith("video/"):
+        next_task = {"task": "transcode_video", "kwargs": kwargs}
+
+    # Trigger Document Sanitization if applicable
+    elif content_type == "application/pdf":
+        next_task = {"task": "sanitize_document", "kwargs": kwargs}
+
+    # Trigger Virus Scan first; it hands clean files on to the processing job
+    if settings.CLAMAV_ENABLED:
+        return ("scan_file", {**kwargs, "next_task": next_task})
+
+    if next_task:
+        return (next_task["task"], next_task["kwargs"])
+    return None
+
+
+class JobConsumer:
+    # Seconds between sweeps for jobs whose worker died on their last attempt
+    DEAD_LETTER_INTERVAL = 60
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._last_sweep = 0.0
+
+    def _dead_letter(self, now: datetime):
+        """Fail expired leases that have no attempts left, instead of retrying them forever"""
+        if time.monotonic() - self._last_sweep < self.DEAD_LETTER_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        self.collection.update_many(
+            {
+                "status": RUNNING,
+                "locked_until": {"$lte": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+            },
+            {"$set": {
+                "status": FAILED,
+                "finished_at": now,
+                "last_error": "Lease expired on the last attempt (worker died or stalled)",
+                "locked_until": None,
+                "lease": None,
+            }},
+        )
+
+    def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        self._dead_letter(now)
+        return self.collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "available_at": {"$lte": now}},
+                # Lease expired: the previous worker crashed or stalled
+                {
+                    "status": RUNNING,
+                    "locked_until": {"$lte": now},
+                    "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+                },
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "locked_until": now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+                    "lease": uuid.uuid4().hex,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def renew(self, job: dict) -> bool:
+        """Extend the lease; False when another worker has taken the job over"""
+        result = self.collection.update_one(
+            {"_id": job["_id"], "lease": job["lease"]},
+            {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT)}},
+        )
+        return result.matched_count == 1
+
+    @contextmanager
+    def heartbeat(self, job: dict):
+        """Renew the job's lease every third of JOB_VISIBILITY_TIMEOUT while the block runs"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(settings.JOB_VISIBILITY_TIMEOUT / 3):
+                try:
+                    if not self.renew(job):
+                        logger.warning("Lost the lease on job %s (%s)", job["_id"], job["task"])
+                        return
+                except Exception as e:
+                    # Transient; the lease still has two thirds of its time left
+                    logger.warning("Could not renew the lease on job %s: %s", job["_id"], e)
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{job['_id']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job: dict):
+        self.collection.update_one(
+            {"_id": job["_id"], "lease": job["lease"]},
+            {"$set": {"status": DONE, "finished_at": datetime.utcnow(), "locked_until": None, "lease": None}},
+        )
+
+    def complete_many(self, jobs: list[dict]):
+        """Settle several finished jobs with one write"""
+        self.collection.update_many(
+            # Leases are unique per claim, so a job another worker took over is left alone
+            {"_id": {"$in": [job["_id"] for job in jobs]}, "lease": {"$in": [job["lease"] for job in jobs]}},
+            {"$set": {"status": DONE, "finished_at": datetime.utcnow(), "locked_until": None, "lease": None}},
+        )
+
+    def fail(self, job: dict, error: str):
+        """Reschedule with exponential backoff, or give up after max_attempts"""
+        now = datetime.utcnow()
+        if job["attempts"] >= job["max_attempts"]:
+            update = {"status": FAILED, "finished_at": now}
+        else:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+            update = {"status": QUEUED, "available_at": now + timedelta(seconds=delay)}
+        update.update({"last_error": error, "locked_until": None, "lease": None})
+        self.collection.update_one({"_id": job["_id"], "lease": job["lease"]}, {"$set": update})
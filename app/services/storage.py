@@ -1,45 +1,220 @@
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator
+
+import certifi
+import urllib3
 from minio import Minio
-from datetime import timedelta
+from minio.datatypes import Part
+from minio.notificationconfig import NotificationConfig, QueueConfig
 from app.core.config import settings
+from app.core.metrics import DEPENDENCY_LATENCY
+from app.services.presign import Presigner, CachedGetPresigner
 
 class StorageService:
+    """Async facade over the synchronous MinIO SDK.
+
+    Every S3 round trip runs on a dedicated, bounded thread pool so request
+    handlers never block the event loop. The urllib3 pool is sized to match
+    the thread pool so workers don't queue on connections.
+    """
+
     def __init__(self):
+        self.http_client = urllib3.PoolManager(
+            num_pools=10,
+            maxsize=settings.MINIO_MAX_CONNECTIONS,
+            block=True,
+            timeout=urllib3.Timeout(
+                connect=settings.MINIO_CONNECT_TIMEOUT,
+                read=settings.MINIO_READ_TIMEOUT
+            ),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+            retries=urllib3.Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
         self.client = Minio(
             endpoint=settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+            region=settings.MINIO_REGION,
+            http_client=self.http_client
+        )
+        self.presigner = Presigner(
+            endpoint=settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            region=settings.MINIO_REGION,
             secure=settings.MINIO_SECURE
         )
+        self.get_presigner = CachedGetPresigner(self.presigner, window=settings.PRESIGNED_CACHE_WINDOW)
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.MINIO_MAX_WORKERS,
+            thread_name_prefix="minio"
+        )
 
-    def generate_presigned_url(self, bucket_name: str, object_name: str, method: str = "PUT") -> str:
-        # method argument is ignored if we use presigned_put_object, 
-        # but we keep the signature for compatibility or just use it.
-        if method != "PUT":
-             # Fallback for other methods if needed, or just error.
-             return self.client.get_presigned_url(
-                method=method,
-                bucket_name=bucket_name,
-                object_name=object_name,
-                expires=timedelta(seconds=settings.PRESIGNED_EXPIRY),
-            )
-            
-        return self.client.presigned_put_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            expires=timedelta(seconds=settings.PRESIGNED_EXPIRY),
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+        finally:
+            # Includes the wait for a free thread, which is what callers feel
+            DEPENDENCY_LATENCY.labels("minio", func.__name__.lstrip("_")).observe(time.perf_counter() - start)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.http_client.clear()
+
+    def generate_presigned_url(self, bucket_name: str, object_name: str, method: str = "PUT", expires: int = None) -> str:
+        # Signed locally: no region lookup or other network call
+        expires = expires or settings.PRESIGNED_EXPIRY
+        with DEPENDENCY_LATENCY.labels("minio", "presign").time():
+            if method == "GET":
+                return self.get_presigner.presign_get(bucket_name, object_name, expires)
+            return self.presigner.presign(method, bucket_name, object_name, expires)
+
+    def presign_upload_parts(self, bucket_name: str, object_name: str, upload_id: str, part_count: int) -> list[str]:
+        """Presigned PUT URLs for parts 1..part_count of a multipart upload"""
+        with DEPENDENCY_LATENCY.labels("minio", "presign_parts").time():
+            return [
+                self.presigner.presign(
+                    "PUT", bucket_name, object_name, settings.PRESIGNED_EXPIRY,
+                    query_params={"partNumber": part_number, "uploadId": upload_id}
+                )
+                for part_number in range(1, part_count + 1)
+            ]
+
+    async def create_multipart_upload(self, bucket_name: str, object_name: str, content_type: str) -> str:
+        return await self._run(
+            self.client._create_multipart_upload,
+            bucket_name, object_name, {"Content-Type": content_type}
+        )
+
+    async def complete_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str, parts: list[tuple[int, str]]):
+        """Assemble the uploaded parts, given as (part_number, etag) pairs"""
+        return await self._run(
+            self.client._complete_multipart_upload,
+            bucket_name, object_name, upload_id,
+            [Part(part_number, etag) for part_number, etag in sorted(parts)]
         )
 
-    def check_object_exists(self, bucket_name: str, object_name: str) -> bool:
+    async def abort_multipart_upload(self, bucket_name: str, object_name: str, upload_id: str):
+        await self._run(self.client._abort_multipart_upload, bucket_name, object_name, upload_id)
+
+    def _create_public_bucket(self, bucket_name: str):
+        if self.client.bucket_exists(bucket_name=bucket_name):
+            return
+        self.client.make_bucket(bucket_name=bucket_name)
+        policy = {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Principal": {"AWS": "*"},
+                    "Action": ["s3:GetObject"],
+                    "Resource": [f"arn:aws:s3:::{bucket_name}/*"]
+                }
+            ]
+        }
+        self.client.set_bucket_policy(bucket_name=bucket_name, policy=json.dumps(policy))
+        self._enable_notifications(bucket_name)
+
+    def _enable_notifications(self, bucket_name: str):
+        if not settings.MINIO_NOTIFY_ARN:
+            return
+        self.client.set_bucket_notification(bucket_name, NotificationConfig(queue_config_list=[
+            QueueConfig(events=["s3:ObjectCreated:*", "s3:ObjectRemoved:*"], queue=settings.MINIO_NOTIFY_ARN)
+        ]))
+
+    async def enable_notifications(self, bucket_name: str):
+        """Point the bucket's object events at the MINIO_NOTIFY_ARN webhook target"""
+        await self._run(self._enable_notifications, bucket_name)
+
+    async def create_public_bucket(self, bucket_name: str):
+        """Create a bucket with a public-read policy for permanent access"""
+        await self._run(self._create_public_bucket, bucket_name)
+
+    async def bucket_exists(self, bucket_name: str) -> bool:
+        return await self._run(self.client.bucket_exists, bucket_name=bucket_name)
+
+    async def remove_bucket(self, bucket_name: str):
+        await self._run(self.client.remove_bucket, bucket_name=bucket_name)
+
+    async def check_object_exists(self, bucket_name: str, object_name: str) -> bool:
         try:
-            self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+            await self.get_object_stats(bucket_name=bucket_name, object_name=object_name)
             return True
         except Exception:
             return False
 
-    def delete_object(self, bucket_name: str, object_name: str):
-        self.client.remove_object(bucket_name=bucket_name, object_name=object_name)
+    async def delete_object(self, bucket_name: str, object_name: str):
+        await self._run(self.client.remove_object, bucket_name=bucket_name, object_name=object_name)
+
+    async def get_object_stats(self, bucket_name: str, object_name: str):
+        return await self._run(self.client.stat_object, bucket_name=bucket_name, object_name=object_name)
+
+    async def download_file(self, bucket_name: str, object_name: str, file_path: str):
+        await self._run(self.client.fget_object, bucket_name=bucket_name, object_name=object_name, file_path=file_path)
+
+    def _list_batch(self, objects, batch_size: int) -> list:
+        return list(islice(objects, batch_size))
+
+    def _get_object_bytes(self, bucket_name: str, object_name: str) -> tuple[bytes, str]:
+        response = self.client.get_object(bucket_name=bucket_name, object_name=object_name)
+        try:
+            return response.read(), response.headers.get("ETag", "").strip('"')
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def get_object_bytes(self, bucket_name: str, object_name: str) -> tuple[bytes, str]:
+        """Small objects only: returns (content, etag)"""
+        return await self._run(self._get_object_bytes, bucket_name, object_name)
+
+    def _sha256_object(self, bucket_name: str, object_name: str) -> str:
+        response = self.client.get_object(bucket_name=bucket_name, object_name=object_name)
+        try:
+            digest = hashlib.sha256()
+            for chunk in response.stream(1024 * 1024):
+                digest.update(chunk)
+            return digest.hexdigest()
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def sha256_object(self, bucket_name: str, object_name: str) -> str:
+        """Stream an object through SHA-256; returns the hex digest"""
+        return await self._run(self._sha256_object, bucket_name, object_name)
+
+    async def upload_file(self, bucket_name: str, object_name: str, file_path: str, content_type: str) -> str:
+        """Upload a local file; returns the new object's ETag"""
+        result = await self._run(
+            self.client.fput_object,
+            bucket_name=bucket_name, object_name=object_name, file_path=file_path, content_type=content_type
+        )
+        return result.etag
 
-    def get_object_stats(self, bucket_name: str, object_name: str):
-        return self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+    async def list_objects(self, bucket_name: str, recursive: bool = True, batch_size: int = 1000,
+                           prefix: str = None, start_after: str = None) -> AsyncIterator:
+        """Stream a bucket listing in key order, fetching `batch_size` entries per thread hop"""
+        objects = iter(self.client.list_objects(
+            bucket_name=bucket_name, prefix=prefix, recursive=recursive, start_after=start_after
+        ))
+        while True:
+            batch = await self._run(self._list_batch, objects, batch_size)
+            if not batch:
+                return
+            for obj in batch:
+                yield obj
 
 storage_service = StorageService()
@@ -0,0 +1,141 @@
+"""
+Streaming reconciliation of the `files` collection with MinIO.
+
+Both sides are read in key order (MinIO lists lexicographically, and the
+Mongo cursor is sorted by `object_key` on the files index) and merge-joined,
+so memory stays constant whatever the bucket size. Differences are written
+with unordered bulk_write batches, and after each batch the bucket records
+a checkpoint so an interrupted sync resumes where it stopped.
+"""
+import re
+from datetime import datetime
+from typing import Optional
+
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.models.file import File
+from app.services.images import VARIANT_PREFIX
+from app.services.storage import storage_service
+
+SYNC_BATCH_SIZE = 1000
+
+# Worker outputs stored next to their source objects
+GENERATED_SUFFIXES = ("_sanitized.pdf", "_optimized.webp", "_transcoded.mp4")
+
+
+def is_generated(object_name: str) -> bool:
+    return object_name.startswith(VARIANT_PREFIX) or object_name.endswith(GENERATED_SUFFIXES)
+
+
+async def _next(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def sync_bucket(db, project_id: str, bucket: dict, prefix: Optional[str] = None, resume: bool = True) -> dict:
+    """Merge-join one bucket's listing with its file documents; returns counts"""
+    bucket_name = bucket["name"]
+    physical_name = bucket["physical_name"]
+    scope = {"project_id": project_id, "bucket_name": bucket_name}
+    stats = {"added": 0, "removed": 0, "updated": 0}
+
+    checkpoint = bucket.get("sync_checkpoint") or {}
+    start_after = checkpoint.get("last_key") if resume and checkpoint.get("prefix") == prefix else None
+
+    # Duplicates (source_file_id set) have no object of their own; their
+    # content is matched through the storage_key of the file they mirror
+    query = {**scope, "source_file_id": None}
+    key_range = {}
+    if prefix:
+        key_range["$regex"] = f"^{re.escape(prefix)}"
+    if start_after:
+        key_range["$gt"] = start_after
+    if key_range:
+        query["object_key"] = key_range
+    db_files = db.files.find(query, {"object_key": 1, "size": 1}).sort("object_key", 1)
+
+    minio_objects = (
+        obj async for obj in storage_service.list_objects(physical_name, prefix=prefix, start_after=start_after)
+        if not is_generated(obj.object_name)
+    )
+
+    ops, missing, orphans = [], [], []
+
+    async def flush(last_key: Optional[str]):
+        if missing:
+            # Keep objects that only deduplicated files reference
+            held = set(await db.files.distinct(
+                "storage_key", {**scope, "storage_key": {"$in": [obj.object_name for obj in missing]}}
+            ))
+            for obj in missing:
+                if obj.object_name not in held:
+                    ops.append(InsertOne(File(
+                        project_id=project_id,
+                        bucket_name=bucket_name,
+                        object_key=obj.object_name,
+                        size=obj.size,
+                        content_type="application/octet-stream" # Default, can't easily guess without head
+                    ).model_dump(by_alias=True, exclude={"id"})))
+        if orphans:
+            ops.append(DeleteMany({**scope, "$or": [
+                {"object_key": {"$in": orphans}},
+                {"storage_key": {"$in": orphans}}
+            ]}))
+            await db.blobs.delete_many({**scope, "object_key": {"$in": orphans}})
+        if ops:
+            try:
+                result = (await db.files.bulk_write(ops, ordered=False)).bulk_api_result
+            except BulkWriteError as e:
+                # Objects completed through the API while the sync ran are already recorded
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+                result = e.details
+            stats["added"] += result["nInserted"]
+            stats["removed"] += result["nRemoved"]
+            stats["updated"] += result["nModified"]
+        ops.clear()
+        missing.clear()
+        orphans.clear()
+
+        if last_key is not None:
+            await db.buckets.update_one({"_id": bucket["_id"]}, {"$set": {"sync_checkpoint": {
+                "prefix": prefix,
+                "last_key": last_key,
+                "updated_at": datetime.utcnow()
+            }}})
+
+    obj, doc = await _next(minio_objects), await _next(db_files)
+    matched = False # `obj` already has a file document
+    last_key = None
+    while obj is not None or doc is not None:
+        if doc is None or (obj is not None and obj.object_name < doc["object_key"]):
+            # In MinIO but not in DB
+            if not matched:
+                missing.append(obj)
+            last_key = obj.object_name
+            obj, matched = await _next(minio_objects), False
+        elif obj is None or doc["object_key"] < obj.object_name:
+            # In DB but not in MinIO
+            orphans.append(doc["object_key"])
+            last_key = doc["object_key"]
+            doc = await _next(db_files)
+        else:
+            # Same key; the object may have several file documents
+            if doc["size"] != obj.size:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"size": obj.size}}))
+            matched = True
+            doc = await _next(db_files)
+
+        # Checkpoint only between keys, never inside a run of equal keys
+        if len(ops) + len(missing) + len(orphans) >= SYNC_BATCH_SIZE and not matched:
+            await flush(last_key)
+
+    await flush(None)
+    await db.buckets.update_one(
+        {"_id": bucket["_id"]},
+        {"$set": {"last_synced_at": datetime.utcnow()}, "$unset": {"sync_checkpoint": ""}}
+    )
+    return stats
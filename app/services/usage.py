@@ -0,0 +1,86 @@
+"""
+Materialized per-project usage counters.
+
+`bucket_count`, `file_count` and `total_size` live on the project document
+and are kept current with $inc wherever buckets or files change, so the
+project listing is a single read. `total_size` counts each file's `size`
+plus the `derived_size` of the renditions the worker stored for it.
+`repair_usage` recomputes them from the collections to correct any drift;
+the API runs it on startup for projects that have no counters yet.
+"""
+import logging
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Projects created before the counters existed; an $inc there would start from 0
+MISSING_COUNTERS = {"$or": [
+    {"bucket_count": {"$exists": False}},
+    {"file_count": {"$exists": False}},
+    {"total_size": {"$exists": False}},
+]}
+
+
+def usage_inc(buckets: int = 0, files: int = 0, size: int = 0) -> dict:
+    """$inc update for the counters; usable with Motor and PyMongo alike"""
+    inc = {}
+    if buckets:
+        inc["bucket_count"] = buckets
+    if files:
+        inc["file_count"] = files
+    if size:
+        inc["total_size"] = size
+    return {"$inc": inc}
+
+
+async def add_usage(db, project_id: str, buckets: int = 0, files: int = 0, size: int = 0):
+    update = usage_inc(buckets, files, size)
+    if update["$inc"]:
+        await db.projects.update_one({"_id": ObjectId(project_id)}, update)
+
+
+async def repair_usage(db, project_id: Optional[str] = None, missing_only: bool = False) -> dict:
+    """Recompute the counters of one project, or of every live project (or only those without counters)"""
+    project_filter = {"deleted_at": None}
+    if project_id:
+        project_filter["_id"] = ObjectId(project_id)
+    if missing_only:
+        project_filter.update(MISSING_COUNTERS)
+
+    ops, repaired = [], 0
+    async for project in db.projects.find(project_filter, {"_id": 1}):
+        pid = str(project["_id"])
+        # Served from the (project_id, size) index
+        stats = await db.files.aggregate([
+            {"$match": {"project_id": pid}},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "total_size": {
+                "$sum": {"$add": ["$size", {"$ifNull": ["$derived_size", 0]}]}
+            }}}
+        ]).to_list(1)
+        ops.append(UpdateOne({"_id": project["_id"]}, {"$set": {
+            "bucket_count": await db.buckets.count_documents({"project_id": pid}),
+            "file_count": stats[0]["count"] if stats else 0,
+            "total_size": stats[0]["total_size"] if stats else 0
+        }}))
+        if len(ops) >= 500:
+            await db.projects.bulk_write(ops, ordered=False)
+            repaired += len(ops)
+            ops = []
+
+    if ops:
+        await db.projects.bulk_write(ops, ordered=False)
+        repaired += len(ops)
+    return {"repaired": repaired}
+
+
+async def baseline_usage(db):
+    """Startup: give projects without counters their initial values"""
+    try:
+        result = await repair_usage(db, missing_only=True)
+        if result["repaired"]:
+            logger.info("Initialized usage counters of %d projects", result["repaired"])
+    except Exception:
+        logger.exception("Initializing usage counters failed")
@@ -0,0 +1,161 @@
+"""
+ffmpeg pipeline for uploaded videos.
+
+ffmpeg reads the source straight from MinIO through a presigned URL (HTTP
+range requests, so MP4s with a trailing moov atom work too) and writes an
+HLS ladder to a temp directory. Progress is parsed line by line from
+`-progress pipe:1`, and stderr goes to a log file, so nothing is buffered
+in memory.
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+# (name, height, video kbps, audio kbps), largest first
+HLS_LADDER = [
+    ("1080p", 1080, 5000, 192),
+    ("720p", 720, 2800, 128),
+    ("480p", 480, 1400, 128),
+    ("360p", 360, 800, 96),
+]
+HLS_MASTER = "master.m3u8"
+HLS_CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+# Caps concurrent ffmpeg runs in this process, whatever the worker concurrency
+_slots = threading.BoundedSemaphore(settings.VIDEO_MAX_CONCURRENT)
+
+
+def ffmpeg_threads() -> int:
+    """Threads per ffmpeg run, so concurrent runs together use about every core"""
+    return settings.VIDEO_FFMPEG_THREADS or max(1, (os.cpu_count() or 1) // settings.VIDEO_MAX_CONCURRENT)
+
+
+def probe(input_url: str) -> dict:
+    """Duration in seconds, video height and whether there is an audio stream"""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration:stream=codec_type,height",
+            "-of", "json", input_url
+        ],
+        check=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60
+    )
+    info = json.loads(result.stdout)
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise ValueError("No video stream found")
+    duration = info.get("format", {}).get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "height": video.get("height") or 0,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+
+def select_ladder(source_height: int) -> list[tuple]:
+    """Renditions no taller than the source; small sources get a single rendition"""
+    ladder = [rung for rung in HLS_LADDER if rung[1] <= source_height]
+    if not ladder:
+        smallest = HLS_LADDER[-1]
+        height = max(2, source_height - source_height % 2)
+        ladder = [(f"{height}p", height, smallest[2], smallest[3])]
+    return ladder
+
+
+def build_hls_command(input_url: str, output_dir: str, ladder: list[tuple], has_audio: bool, threads: int) -> list[str]:
+    """One ffmpeg run: decode once, scale to every rendition, segment as HLS"""
+    count = len(ladder)
+    splits = "".join(f"[v{i}]" for i in range(count))
+    scales = ";".join(f"[v{i}]scale=-2:{rung[1]}[v{i}out]" for i, rung in enumerate(ladder))
+    segment = settings.VIDEO_HLS_SEGMENT_SECONDS
+
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostdin", "-y", "-loglevel", "error",
+        "-progress", "pipe:1", "-nostats",
+        "-threads", str(threads),
+        "-i", input_url,
+        "-filter_complex", f"[0:v]split={count}{splits};{scales}",
+    ]
+    stream_map = []
+    for i, (name, _, video_kbps, audio_kbps) in enumerate(ladder):
+        cmd += [
+            "-map", f"[v{i}out]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", f"{video_kbps}k",
+            f"-maxrate:v:{i}", f"{video_kbps}k",
+            f"-bufsize:v:{i}", f"{video_kbps * 2}k",
+        ]
+        if has_audio:
+            cmd += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", f"{audio_kbps}k"]
+            stream_map.append(f"v:{i},a:{i},name:{name}")
+        else:
+            stream_map.append(f"v:{i},name:{name}")
+
+    cmd += [
+        "-threads", str(threads),
+        "-preset", "veryfast",
+        # Keyframes on segment boundaries keep renditions switchable
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment})",
+        "-sc_threshold", "0",
+        "-f", "hls",
+        "-hls_time", str(segment),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(output_dir, "%v", "seg_%05d.ts"),
+        "-master_pl_name", HLS_MASTER,
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(output_dir, "%v", "index.m3u8"),
+    ]
+    return cmd
+
+
+def _log_tail(log_path: str, limit: int = 2000) -> str:
+    with open(log_path, "rb") as f:
+        f.seek(max(0, os.path.getsize(log_path) - limit))
+        return f.read().decode(errors="replace").strip()
+
+
+def run_ffmpeg(cmd: list[str], duration: Optional[float], log_path: str,
+               on_progress: Optional[Callable[[float], None]] = None):
+    """Run ffmpeg, reporting percent done at most every VIDEO_PROGRESS_INTERVAL seconds"""
+    with _slots, open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=log, text=True
+        )
+        try:
+            last_report = time.monotonic()
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                if key != "out_time_us" or not value.isdigit() or not duration or on_progress is None:
+                    continue
+                now = time.monotonic()
+                if now - last_report >= settings.VIDEO_PROGRESS_INTERVAL:
+                    last_report = now
+                    on_progress(round(min(99.0, int(value) / 1e6 / duration * 100), 1))
+            process.wait()
+        finally:
+            # Never leave ffmpeg running after an error in this thread
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {_log_tail(log_path)}")
+
+
+def transcode_hls(input_url: str, work_dir: str, on_progress: Optional[Callable[[float], None]] = None) -> tuple[str, list[str]]:
+    """Render the HLS ladder into `work_dir`; returns (output dir, rendition names)"""
+    info = probe(input_url)
+    ladder = select_ladder(info["height"])
+    output_dir = os.path.join(work_dir, "hls")
+    for name, *_ in ladder:
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+
+    cmd = build_hls_command(input_url, output_dir, ladder, info["has_audio"], ffmpeg_threads())
+    run_ffmpeg(cmd, info["duration"], os.path.join(work_dir, "ffmpeg.log"), on_progress)
+    return output_dir, [rung[0] for rung in ladder]
@@ -1,254 +1,503 @@
 from app.core.config import settings
-import clamd
+from app.core.database import connect_sync, pool_metrics
+from app.core.log import configure_logging
+from app.core.metrics import JOBS_IN_FLIGHT, JOBS_PROCESSED, stage_timer
+from app.services.images import (
+    CONTENT_TYPES, VARIANT_PREFIX, generate_variants_file, optimize_image_file,
+    run_in_pool, shutdown_pool, variant_key
+)
+from app.services.clamav import ClamdPool, ClamdStreamTooLarge, ClamdUnavailable
+from app.services.documents import sanitize_pdf_file
+from app.services.video import HLS_CONTENT_TYPES, HLS_MASTER, transcode_hls
+from app.services.queue import JobConsumer, new_job
+from app.services.usage import usage_inc
+from app.services.batching import UpdateBatcher
+import argparse
+import atexit
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
 from minio import Minio
-from pymongo import MongoClient
-import io
+from minio.deleteobjects import DeleteObject
 import os
-from PIL import Image
-import subprocess
+import shutil
+import signal
+import threading
 import tempfile
-from pypdf import PdfReader, PdfWriter
 from bson import ObjectId
+from prometheus_client import start_http_server
+from pymongo import UpdateOne
+
+# Run as `python -m app.worker`, so __name__ would be "__main__"
+logger = logging.getLogger("app.worker")
+
+# S3 multi-object delete accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
 
 # Initialize Clients
 minio_client = Minio(
     endpoint=settings.MINIO_ENDPOINT,
     access_key=settings.MINIO_ACCESS_KEY,
     secret_key=settings.MINIO_SECRET_KEY,
-    secure=settings.MINIO_SECURE
+    secure=settings.MINIO_SECURE,
+    region=settings.MINIO_REGION
 )
 
-mongo_client = MongoClient(settings.MONGO_URI)
-db = mongo_client[settings.MONGO_DB_NAME]
+mongo_client, db = connect_sync()
 
-def get_clamav_client():
-    try:
-        return clamd.ClamdNetworkSocket(settings.CLAMAV_HOST, settings.CLAMAV_PORT)
-    except Exception as e:
-        return None
+clamav_pool = ClamdPool(
+    settings.CLAMAV_HOST,
+    settings.CLAMAV_PORT,
+    size=settings.CLAMAV_MAX_CONNECTIONS,
+    connect_timeout=settings.CLAMAV_CONNECT_TIMEOUT,
+    timeout=settings.CLAMAV_TIMEOUT
+)
 
-async def scan_file(bucket_name: str, object_key: str, file_id: str):
-    print(f"Scanning file: {bucket_name}/{object_key} (ID: {file_id})")
-    
-    cd = get_clamav_client()
-    if not cd:
-        print("ClamAV not available, skipping scan")
-        return {"status": "skipped", "reason": "ClamAV unavailable"}
+class FileUpdateBatcher(UpdateBatcher):
+    """Batched file updates that keep project usage counters in step with size changes"""
 
-    try:
-        # Get file stream from MinIO
-        response = minio_client.get_object(bucket_name=bucket_name, object_name=object_key)
-        file_content = response.read()
-        response.close()
-        response.release_conn()
-
-        # Scan with ClamAV
-        # clamd expects a stream or bytes. instream() is good for streams.
-        scan_result = cd.instream(io.BytesIO(file_content))
-        
-        status = "clean"
-        result_details = "Clean"
-        
-        if scan_result and scan_result.get('stream') and scan_result['stream'][0] == 'FOUND':
-            status = "infected"
-            result_details = scan_result['stream'][1]
-            print(f"VIRUS DETECTED: {result_details}")
-            
-            # Quarantine or Delete (for now, just mark as infected)
-            # In production, you might move it to a quarantine bucket
-        
-        # Update MongoDB
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": status, "scan_result": result_details}}
-        )
-        
-        return {"status": status, "file": object_key, "details": result_details}
+    SIZE_FIELDS = ("size", "derived_size")
 
+    def _write(self, batch: dict):
+        resized = {
+            key: fields for key, (_, fields) in batch.items()
+            if any(field in fields for field in self.SIZE_FIELDS)
+        }
+        # Sizes as they are before this batch: one read for every resized file and its duplicates
+        previous = list(self.collection.find(
+            {"$or": [batch[key][0] for key in resized]},
+            {"project_id": 1, "source_file_id": 1, **{field: 1 for field in self.SIZE_FIELDS}}
+        )) if resized else []
+
+        super()._write(batch)
+
+        deltas = {}
+        for doc in previous:
+            fields = resized.get(doc.get("source_file_id") or str(doc["_id"]), {})
+            delta = sum(fields[field] - doc.get(field, 0) for field in self.SIZE_FIELDS if field in fields)
+            deltas[doc["project_id"]] = deltas.get(doc["project_id"], 0) + delta
+        ops = [
+            UpdateOne({"_id": ObjectId(project_id)}, usage_inc(size=delta))
+            for project_id, delta in deltas.items() if delta
+        ]
+        if ops:
+            try:
+                self.collection.database.projects.bulk_write(ops, ordered=False)
+            except Exception as e:
+                # The files are written; repair_usage corrects the counters
+                logger.error("Could not update usage of %d projects: %s", len(ops), e)
+
+# File status updates are coalesced into unordered bulk writes
+file_updates = FileUpdateBatcher(
+    db.files,
+    max_ops=settings.WORKER_WRITE_BATCH_SIZE,
+    interval=settings.WORKER_WRITE_FLUSH_INTERVAL
+)
+# Local mode runs tasks inside the API process, which never calls run_worker
+atexit.register(file_updates.close)
+
+def _file_filter(file_id: str) -> dict:
+    """The processed file plus any deduplicated uploads sharing its content"""
+    return {"$or": [{"_id": ObjectId(file_id)}, {"source_file_id": file_id}]}
+
+def _set_file(file_id: str, fields: dict):
+    """Queue a $set on a processed file and its duplicates"""
+    file_updates.set(file_id, _file_filter(file_id), fields)
+
+def _update_file_size(file_id: str, size: int, fields: dict, field: str = "size"):
+    """Set a processed file's new size (or `derived_size`) and other fields; usage follows when the batch is written"""
+    _set_file(file_id, {**fields, field: size})
+
+def _run_task(task, kwargs: dict):
+    """Run a task, first queueing the file fields the job before it handed over"""
+    kwargs = dict(kwargs)
+    handed_over = kwargs.pop("file_fields", None)
+    if handed_over:
+        _set_file(kwargs["file_id"], handed_over)
+    return task(**kwargs)
+
+def _run_next_task(next_task: dict, file_id: str = None, fields: dict = None):
+    """Hand the post-scan processing job on (queued, or inline in local mode).
+
+    The scan's own file `fields` ride along and are set by that job ahead of
+    its own updates, so they can't land after them even when it runs in
+    another worker. Without a next job they are set here.
+    """
+    if not next_task:
+        if fields:
+            _set_file(file_id, fields)
+        return
+    kwargs = {**next_task["kwargs"], "file_fields": fields} if fields else next_task["kwargs"]
+    if settings.JOB_QUEUE_BACKEND == "local":
+        _run_task(TASKS[next_task["task"]], kwargs)
+    else:
+        db.jobs.insert_one(new_job(next_task["task"], kwargs))
+
+def scan_file(bucket_name: str, object_key: str, file_id: str, next_task: dict = None):
+    logger.info("Scanning %s/%s (file %s)", bucket_name, object_key, file_id)
+    
+    try:
+        # clamd would reject it only after the whole limit has been streamed
+        size = minio_client.stat_object(bucket_name=bucket_name, object_name=object_key).size
+        if size > settings.CLAMAV_MAX_STREAM_SIZE:
+            raise ClamdStreamTooLarge(f"{size} bytes exceeds CLAMAV_MAX_STREAM_SIZE")
+        with stage_timer("scan_file", "scan"), clamav_pool.connection() as cd:
+            # Pipe the MinIO object into clamd chunk by chunk
+            response = minio_client.get_object(bucket_name=bucket_name, object_name=object_key)
+            try:
+                verdict, signature = cd.instream(response, clamav_pool.chunk_size)
+            finally:
+                response.close()
+                response.release_conn()
+    except ClamdUnavailable:
+        logger.warning("ClamAV not available, skipping scan of %s/%s", bucket_name, object_key)
+        _run_next_task(next_task)
+        return {"status": "skipped", "reason": "ClamAV unavailable"}
+    except ClamdStreamTooLarge as e:
+        # Deterministic: report it and process the file unscanned rather than retry
+        logger.warning("%s/%s is too large to scan: %s", bucket_name, object_key, e)
+        _run_next_task(next_task, file_id, {"status": "scan_skipped", "scan_result": str(e)})
+        return {"status": "skipped", "reason": str(e)}
     except Exception as e:
-        print(f"Error scanning file: {e}")
+        logger.error("Error scanning %s/%s: %s", bucket_name, object_key, e)
         # Update DB with error
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": "error", "scan_result": str(e)}}
-        )
+        _set_file(file_id, {"status": "error", "scan_result": str(e)})
         return {"status": "error", "error": str(e)}
 
-async def optimize_image(bucket_name: str, object_key: str, file_id: str):
-    print(f"Optimizing image: {bucket_name}/{object_key} (ID: {file_id})")
+    status = "clean"
+    result_details = "Clean"
+    
+    if verdict == "FOUND":
+        status = "infected"
+        result_details = signature
+        logger.warning("Virus detected in %s/%s: %s", bucket_name, object_key, result_details)
+        
+        # Quarantine or Delete (for now, just mark as infected)
+        # In production, you might move it to a quarantine bucket
+    
+    # Only clean files go on to optimization / transcoding / sanitization
+    fields = {"status": status, "scan_result": result_details}
+    if status == "clean":
+        _run_next_task(next_task, file_id, fields)
+    else:
+        _set_file(file_id, fields)
+    
+    return {"status": status, "file": object_key, "details": result_details}
+
+def optimize_image(bucket_name: str, object_key: str, file_id: str, variants: list = None):
+    logger.info("Optimizing image %s/%s (file %s)", bucket_name, object_key, file_id)
     
+    # Image bytes travel between processes via temp files, never pickled
+    tmp_dir = tempfile.mkdtemp(prefix="optimize-")
+    input_path = os.path.join(tmp_dir, "input")
+    output_path = os.path.join(tmp_dir, "output.webp")
     try:
         # Get file from MinIO
-        response = minio_client.get_object(bucket_name=bucket_name, object_name=object_key)
-        file_content = response.read()
-        response.close()
-        response.release_conn()
+        with stage_timer("optimize_image", "download"):
+            minio_client.fget_object(bucket_name=bucket_name, object_name=object_key, file_path=input_path)
 
-        # Process with Pillow
-        img = Image.open(io.BytesIO(file_content))
-        
-        # Convert to RGB if necessary (e.g. for PNG to JPEG/WebP)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-            
-        # Resize if too large (max 1920px width)
-        max_width = 1920
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-        # Save as WebP
-        output = io.BytesIO()
-        img.save(output, format="WEBP", quality=80, optimize=True)
-        output.seek(0)
+        if variants:
+            return _generate_variants(bucket_name, object_key, file_id, input_path, tmp_dir, variants)
+
+        # Process with Pillow on the CPU process pool (decode and encode happen there)
+        with stage_timer("optimize_image", "process"):
+            size = run_in_pool(optimize_image_file, input_path, output_path)
         
-        # Upload optimized version
         # Upload optimized version (overwrite original)
         # We keep the original extension (e.g. .jpg) but store WebP content
         # This ensures the object_key remains consistent for the client
-        minio_client.put_object(
-            bucket_name=bucket_name,
-            object_name=object_key,
-            data=output,
-            length=output.getbuffer().nbytes,
-            content_type="image/webp"
-        )
+        with stage_timer("optimize_image", "upload"):
+            minio_client.fput_object(
+                bucket_name=bucket_name,
+                object_name=object_key,
+                file_path=output_path,
+                content_type="image/webp"
+            )
         
         # Update MongoDB
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {
+        with stage_timer("optimize_image", "db_update"):
+            _update_file_size(file_id, size, {
                 "status": "optimized", 
-                "content_type": "image/webp",
-                "size": output.getbuffer().nbytes
-            }}
-        )
+                "content_type": "image/webp"
+            })
         
         return {"status": "optimized", "original": object_key, "new_key": object_key}
 
     except Exception as e:
-        print(f"Error optimizing image: {e}")
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": "optimization_failed", "scan_result": str(e)}}
-        )
+        logger.error("Error optimizing %s/%s: %s", bucket_name, object_key, e)
+        _set_file(file_id, {"status": "optimization_failed", "scan_result": str(e)})
         return {"status": "error", "error": str(e)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-async def transcode_video(bucket_name: str, object_key: str, file_id: str):
-    print(f"Transcoding video: {bucket_name}/{object_key} (ID: {file_id})")
-    
-    try:
-        # Get file from MinIO
-        response = minio_client.get_object(bucket_name=bucket_name, object_name=object_key)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(object_key)[1]) as tmp_input:
-            tmp_input.write(response.read())
-            tmp_input_path = tmp_input.name
-            
-        response.close()
-        response.release_conn()
-        
-        # Output path
-        tmp_output_path = os.path.splitext(tmp_input_path)[0] + "_transcoded.mp4"
-        
-        # Transcode with FFmpeg
-        # ffmpeg -i input -c:v libx264 -c:a aac output.mp4
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", tmp_input_path,
-            "-c:v", "libx264",
-            "-preset", "fast",
-            "-c:a", "aac",
-            tmp_output_path
-        ]
-        
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Upload transcoded version
-        transcoded_key = f"{os.path.splitext(object_key)[0]}_transcoded.mp4"
-        
-        with open(tmp_output_path, "rb") as f:
-            file_stat = os.stat(tmp_output_path)
-            minio_client.put_object(
+def _generate_variants(bucket_name: str, object_key: str, file_id: str, input_path: str, tmp_dir: str, specs: list):
+    # Keep the original; renditions go under derived keys
+    with stage_timer("optimize_image", "process"):
+        rendered = run_in_pool(generate_variants_file, input_path, tmp_dir, specs)
+
+    variants = []
+    for variant in rendered:
+        key = variant_key(object_key, variant["name"], variant["format"])
+        content_type = CONTENT_TYPES[variant["format"]]
+        with stage_timer("optimize_image", "upload"):
+            minio_client.fput_object(
                 bucket_name=bucket_name,
-                object_name=transcoded_key,
-                data=f,
-                length=file_stat.st_size,
-                content_type="video/mp4"
+                object_name=key,
+                file_path=variant["path"],
+                content_type=content_type
             )
-            
-        # Cleanup
-        os.remove(tmp_input_path)
-        os.remove(tmp_output_path)
-        
-        # Update MongoDB
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": "transcoded", "optimized_version": transcoded_key}}
+        variants.append({
+            "name": variant["name"],
+            "object_key": key,
+            "width": variant["width"],
+            "height": variant["height"],
+            "content_type": content_type,
+            "size": variant["size"],
+        })
+
+    _update_file_size(file_id, sum(v["size"] for v in variants), {"status": "optimized", "variants": variants},
+                      field="derived_size")
+
+    return {"status": "optimized", "original": object_key, "variants": [v["object_key"] for v in variants]}
+
+def transcode_video(bucket_name: str, object_key: str, file_id: str):
+    logger.info("Transcoding video %s/%s (file %s)", bucket_name, object_key, file_id)
+
+    tmp_dir = tempfile.mkdtemp(prefix="transcode-")
+    try:
+        # ffmpeg streams the source from MinIO itself; no local copy of the input
+        input_url = minio_client.presigned_get_object(
+            bucket_name, object_key, expires=timedelta(seconds=settings.VIDEO_INPUT_URL_EXPIRY)
         )
-        
-        return {"status": "transcoded", "original": object_key, "transcoded": transcoded_key}
+
+        _set_file(file_id, {"status": "transcoding", "progress": 0})
+
+        def report_progress(percent: float):
+            _set_file(file_id, {"progress": percent})
+
+        # Download, decode and encode are one streaming ffmpeg run
+        with stage_timer("transcode_video", "process"):
+            output_dir, renditions = transcode_hls(input_url, tmp_dir, report_progress)
+
+        # Upload the ladder (segments and playlists) in parallel
+        prefix = f"{VARIANT_PREFIX}{object_key}/hls/"
+        playlist_key = prefix + HLS_MASTER
+        with stage_timer("transcode_video", "upload"):
+            hls_size = _upload_directory(bucket_name, prefix, output_dir)
+
+        # Update MongoDB
+        _update_file_size(file_id, hls_size, {"status": "transcoded", "optimized_version": playlist_key, "progress": 100},
+                          field="derived_size")
+
+        return {"status": "transcoded", "original": object_key, "transcoded": playlist_key, "renditions": renditions}
 
     except Exception as e:
-        print(f"Error transcoding video: {e}")
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": "transcoding_failed", "scan_result": str(e)}}
-        )
+        logger.error("Error transcoding %s/%s: %s", bucket_name, object_key, e)
+        _set_file(file_id, {"status": "transcoding_failed", "scan_result": str(e)})
         return {"status": "error", "error": str(e)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-async def sanitize_document(bucket_name: str, object_key: str, file_id: str):
-    print(f"Sanitizing document: {bucket_name}/{object_key} (ID: {file_id})")
-    
+def _upload_directory(bucket_name: str, prefix: str, directory: str) -> int:
+    """Upload every file under `directory`; the master playlist goes last so players never see a partial ladder.
+
+    Returns the bytes uploaded.
+    """
+    paths = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+    ]
+    master = os.path.join(directory, HLS_MASTER)
+
+    def upload(path: str):
+        key = prefix + os.path.relpath(path, directory).replace(os.sep, "/")
+        content_type = HLS_CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream")
+        minio_client.fput_object(bucket_name=bucket_name, object_name=key, file_path=path, content_type=content_type)
+
+    with ThreadPoolExecutor(max_workers=settings.VIDEO_UPLOAD_CONCURRENCY) as pool:
+        # list() re-raises the first upload error
+        list(pool.map(upload, [path for path in paths if path != master]))
+    if master in paths:
+        upload(master)
+    return sum(os.path.getsize(path) for path in paths)
+
+def sanitize_document(bucket_name: str, object_key: str, file_id: str):
+    logger.info("Sanitizing document %s/%s (file %s)", bucket_name, object_key, file_id)
+
+    # PDFs are processed on disk, never held in memory
+    tmp_dir = tempfile.mkdtemp(prefix="sanitize-")
+    input_path = os.path.join(tmp_dir, "input.pdf")
+    output_path = os.path.join(tmp_dir, "output.pdf")
     try:
         # Get file from MinIO
-        response = minio_client.get_object(bucket_name=bucket_name, object_name=object_key)
-        file_content = io.BytesIO(response.read())
-        response.close()
-        response.release_conn()
-        
-        # Process PDF
-        reader = PdfReader(file_content)
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            writer.add_page(page)
-            
-        # Remove metadata
-        writer.add_metadata({})
-        
-        # Save sanitized version
-        output = io.BytesIO()
-        writer.write(output)
-        output.seek(0)
-        
-        # Upload sanitized version
+        with stage_timer("sanitize_document", "download"):
+            minio_client.fget_object(bucket_name=bucket_name, object_name=object_key, file_path=input_path)
+
+        # Process PDF on the CPU process pool
+        with stage_timer("sanitize_document", "process"):
+            size = run_in_pool(sanitize_pdf_file, input_path, output_path)
+
+        # Nothing to strip: keep the original untouched
+        if size is None:
+            _set_file(file_id, {"status": "sanitized"})
+            return {"status": "sanitized", "original": object_key, "sanitized": object_key, "rewritten": False}
+
         # Upload sanitized version (overwrite original)
         sanitized_key = object_key
-        minio_client.put_object(
-            bucket_name=bucket_name,
-            object_name=sanitized_key,
-            data=output,
-            length=output.getbuffer().nbytes,
-            content_type="application/pdf"
-        )
-        
+        with stage_timer("sanitize_document", "upload"):
+            minio_client.fput_object(
+                bucket_name=bucket_name,
+                object_name=sanitized_key,
+                file_path=output_path,
+                content_type="application/pdf"
+            )
+
         # Update MongoDB
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {
-                "status": "sanitized", 
-                "size": output.getbuffer().nbytes
-            }}
-        )
-        
-        return {"status": "sanitized", "original": object_key, "sanitized": sanitized_key}
+        with stage_timer("sanitize_document", "db_update"):
+            _update_file_size(file_id, size, {"status": "sanitized"})
+
+        return {"status": "sanitized", "original": object_key, "sanitized": sanitized_key, "rewritten": True}
 
     except Exception as e:
-        print(f"Error sanitizing document: {e}")
-        db.files.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": {"status": "sanitization_failed", "scan_result": str(e)}}
-        )
+        logger.error("Error sanitizing %s/%s: %s", bucket_name, object_key, e)
+        _set_file(file_id, {"status": "sanitization_failed", "scan_result": str(e)})
+        return {"status": "error", "error": str(e)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def delete_project(project_id: str):
+    """Purge a tombstoned project: every bucket's objects, then its metadata.
+
+    Safe to re-run after a crash: finished buckets are gone from the
+    `buckets` collection, and listing only returns objects not yet deleted.
+    """
+    logger.info("Deleting project %s", project_id)
+    project_filter = {"_id": ObjectId(project_id), "deleted_at": {"$ne": None}}
+    if not db.projects.find_one(project_filter, {"_id": 1}):
+        return {"status": "skipped", "reason": "Project not marked for deletion"}
+
+    buckets = list(db.buckets.find({"project_id": project_id}))
+    db.projects.update_one(project_filter, {"$set": {
+        "deletion.status": "running",
+        "deletion.buckets_remaining": len(buckets),
+        "deletion.error": None
+    }})
+
+    try:
+        with ThreadPoolExecutor(max_workers=settings.PROJECT_DELETE_BUCKET_CONCURRENCY) as pool:
+            # list() re-raises the first bucket error
+            list(pool.map(lambda bucket: _purge_bucket(project_id, bucket), buckets))
+    except Exception as e:
+        logger.error("Error deleting project %s: %s", project_id, e)
+        db.projects.update_one(project_filter, {"$set": {"deletion.status": "error", "deletion.error": str(e)}})
         return {"status": "error", "error": str(e)}
+
+    db.files.delete_many({"project_id": project_id})
+    db.blobs.delete_many({"project_id": project_id})
+    db.projects.delete_one(project_filter)
+    return {"status": "deleted", "project_id": project_id, "buckets_deleted": len(buckets)}
+
+def _purge_bucket(project_id: str, bucket: dict):
+    physical_name = bucket["physical_name"]
+    project_filter = {"_id": ObjectId(project_id)}
+
+    if minio_client.bucket_exists(physical_name):
+        objects = minio_client.list_objects(physical_name, recursive=True)
+        while True:
+            # One multi-object delete request per batch
+            batch = [DeleteObject(obj.object_name) for obj in islice(objects, DELETE_BATCH_SIZE)]
+            if not batch:
+                break
+            errors = list(minio_client.remove_objects(physical_name, batch))
+            if errors:
+                raise RuntimeError(f"Failed to delete {len(errors)} objects from {physical_name}: {errors[0].message}")
+            db.projects.update_one(project_filter, {"$inc": {"deletion.objects_deleted": len(batch)}})
+        minio_client.remove_bucket(physical_name)
+
+    db.files.delete_many({"project_id": project_id, "bucket_name": bucket["name"]})
+    db.blobs.delete_many({"project_id": project_id, "bucket_name": bucket["name"]})
+    db.buckets.delete_one({"_id": bucket["_id"]})
+    db.projects.update_one(project_filter, {"$inc": {
+        "deletion.buckets_done": 1,
+        "deletion.buckets_remaining": -1
+    }})
+
+# Task name -> callable, as referenced by queued jobs
+TASKS = {
+    "scan_file": scan_file,
+    "optimize_image": optimize_image,
+    "transcode_video": transcode_video,
+    "sanitize_document": sanitize_document,
+    "delete_project": delete_project,
+}
+
+def _work_loop(consumer: JobConsumer, stop: threading.Event):
+    while not stop.is_set():
+        job = consumer.claim()
+        if not job:
+            stop.wait(settings.WORKER_POLL_INTERVAL)
+            continue
+
+        task = TASKS.get(job["task"])
+        if task is None:
+            consumer.fail(job, f"Unknown task: {job['task']}")
+            continue
+
+        try:
+            with consumer.heartbeat(job), JOBS_IN_FLIGHT.labels(job["task"]).track_inprogress(), \
+                    stage_timer(job["task"], "total"):
+                result = _run_task(task, job["kwargs"])
+        except Exception as e:
+            JOBS_PROCESSED.labels(job["task"], "error").inc()
+            consumer.fail(job, str(e))
+            continue
+
+        # Tasks report their own failures instead of raising
+        if isinstance(result, dict) and result.get("status") == "error":
+            JOBS_PROCESSED.labels(job["task"], "error").inc()
+            consumer.fail(job, result.get("error", "error"))
+        else:
+            JOBS_PROCESSED.labels(job["task"], "ok").inc()
+            # Completed once its file updates are written, with the rest of that flush (see run_worker);
+            # a crash before then leaves it to be retried rather than done with its file in progress
+            file_updates.ack(job)
+
+def run_worker(concurrency: int):
+    consumer = JobConsumer(db.jobs)
+    file_updates.on_flush = consumer.complete_many
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info("Worker shutting down, finishing in-flight jobs...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    threads = [
+        threading.Thread(target=_work_loop, args=(consumer, stop), name=f"worker-{i}")
+        for i in range(concurrency)
+    ]
+    if settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT)
+    # Fail fast on a bad URI; minPoolSize connections are then kept open by the driver
+    mongo_client.admin.command("ping")
+    for thread in threads:
+        thread.start()
+    logger.info("Worker started with concurrency %d", concurrency)
+    for thread in threads:
+        thread.join()
+    file_updates.close()
+    shutdown_pool()
+    clamav_pool.close()
+    logger.info("Worker Mongo pool: %s", pool_metrics.snapshot())
+    mongo_client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued file jobs")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    configure_logging()
+    run_worker(args.concurrency)
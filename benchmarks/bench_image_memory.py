@@ -0,0 +1,121 @@
+"""
+Peak memory of one image optimization job, full decode vs draft decode.
+
+Each case runs in a fresh process and reports how much its peak RSS grew
+while handling a single synthetic JPEG:
+
+- full decode: the old pipeline, which read the object into memory,
+  decoded it at full resolution and resized to 1920px in one LANCZOS pass
+- draft decode: optimize_image_file, which decodes a DCT-scaled draft
+  near the target size and streams the WebP to a file
+- bomb guard: a source above IMAGE_MAX_PIXELS, which open_image rejects
+  from the header without decoding
+
+    python benchmarks/bench_image_memory.py --size 8660x5774  # ~50MP
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are required at import time; nothing here connects to them
+for name in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET",
+             "MONGO_URI", "MONGO_DB_NAME", "ADMIN_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+
+from PIL import Image  # noqa: E402
+
+from app.services.images import MAX_WIDTH, optimize_image_file  # noqa: E402
+
+
+def full_decode(input_path: str, output_path: str):
+    with open(input_path, "rb") as f:
+        content = f.read()
+    img = Image.open(io.BytesIO(content))
+    if img.width > MAX_WIDTH:
+        img = img.resize((MAX_WIDTH, int(img.height * MAX_WIDTH / img.width)), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format="WEBP", quality=80, optimize=True)
+    with open(output_path, "wb") as f:
+        f.write(output.getbuffer())
+
+
+def draft_decode(input_path: str, output_path: str):
+    optimize_image_file(input_path, output_path)
+
+
+def bomb_guard(input_path: str, output_path: str):
+    try:
+        optimize_image_file(input_path, output_path)
+    except ValueError:
+        pass
+
+
+def peak_rss_kib() -> int:
+    """Peak RSS of this process in KiB.
+
+    VmHWM where available: ru_maxrss carries over the parent's peak
+    through fork and exec, which would hide the case being measured.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(case, input_path: str, output_path: str, results):
+    before = peak_rss_kib()
+    start = time.perf_counter()
+    case(input_path, output_path)
+    elapsed = time.perf_counter() - start
+    results.put((peak_rss_kib() - before, elapsed))
+
+
+def measure(context, case, input_path: str, output_path: str) -> tuple[int, float]:
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(case, input_path, output_path, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="8660x5774", help="WIDTHxHEIGHT of the synthetic source")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    # A fresh interpreter per case, so one case's peak doesn't hide the next
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.jpg")
+        noise = Image.effect_noise((width // 8, height // 8), 64).resize((width, height)).convert("RGB")
+        noise.save(source, format="JPEG", quality=90)
+        del noise
+        print(f"{width}x{height} JPEG ({width * height / 1e6:.0f}MP, {os.path.getsize(source) / 1e6:.1f}MB)")
+
+        peaks = {}
+        for label, case in (("full decode", full_decode), ("draft decode", draft_decode)):
+            growth, elapsed = measure(context, case, source, os.path.join(directory, "out.webp"))
+            peaks[label] = growth
+            print(f"{label:>13}: peak RSS +{growth / 1024:7.1f}MB  {elapsed:6.2f}s")
+        if peaks["draft decode"]:
+            print(f"{'reduction':>13}: {peaks['full decode'] / peaks['draft decode']:.1f}x")
+
+        os.environ["IMAGE_MAX_PIXELS"] = str(width * height - 1)
+        growth, elapsed = measure(context, bomb_guard, source, os.path.join(directory, "out.webp"))
+        print(f"{'bomb guard':>13}: peak RSS +{growth / 1024:7.1f}MB  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of the image optimization pipeline, inline vs the process pool.
+
+Generates synthetic JPEGs, then runs optimize_image_file over them in the
+calling thread and in a ProcessPoolExecutor of 1, 4 and N (CPU count)
+workers, reporting images per second for each.
+
+    python benchmarks/bench_image_pool.py --images 32 --size 4000x3000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are required at import time; nothing here connects to them
+for name in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET",
+             "MONGO_URI", "MONGO_DB_NAME", "ADMIN_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+
+from PIL import Image  # noqa: E402
+
+from app.services.images import optimize_image_file  # noqa: E402
+
+
+def make_images(directory: str, count: int, width: int, height: int) -> list[str]:
+    # Noise over a gradient, so the encoder has real work to do
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 64).convert("RGB")
+    source = Image.blend(base, noise, 0.5)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"source-{i}.jpg")
+        source.save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def run_inline(paths: list[str], directory: str) -> float:
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        optimize_image_file(path, os.path.join(directory, f"inline-{i}.webp"))
+    return time.perf_counter() - start
+
+
+def run_pool(paths: list[str], directory: str, workers: int) -> float:
+    context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Start the workers before timing, as the long-lived worker pool would be
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        futures = [
+            pool.submit(optimize_image_file, path, os.path.join(directory, f"pool{workers}-{i}.webp"))
+            for i, path in enumerate(paths)
+        ]
+        for future in futures:
+            future.result()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--size", default="4000x3000", help="WIDTHxHEIGHT of the synthetic sources")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    cpus = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory, args.images, width, height)
+        print(f"{args.images} images of {width}x{height}, {cpus} CPUs")
+
+        elapsed = run_inline(paths, directory)
+        print(f"{'inline':>10}: {args.images / elapsed:7.2f} images/s")
+        for workers in sorted({1, 4, cpus}):
+            elapsed = run_pool(paths, directory, workers)
+            print(f"{f'{workers} worker' + ('s' if workers > 1 else ''):>10}: {args.images / elapsed:7.2f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+PDF sanitization over a synthetic corpus, fast path vs rewrite.
+
+Builds documents of 1 to 500 pages, each once clean and once carrying
+metadata and an OpenAction script, then times sanitize_pdf_file on both:
+clean documents take the fast path (inspected, not rewritten), the
+others are rewritten page by page. Also reports the full rewrite the
+worker used to do for every document, from an in-memory copy.
+
+    python benchmarks/bench_pdf_sanitize.py --pages 1 10 100 500
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfReader, PdfWriter  # noqa: E402
+from pypdf.generic import DictionaryObject, NameObject, StreamObject, TextStringObject  # noqa: E402
+
+from app.services.documents import sanitize_pdf_file  # noqa: E402
+
+
+def make_pdf(path: str, pages: int, dirty: bool):
+    writer = PdfWriter()
+    for n in range(pages):
+        page = writer.add_blank_page(612, 792)
+        # ~20KB of uncompressed drawing operators per page, like a vector scan
+        content = StreamObject()
+        content.set_data("".join(f"{n % 600} {i % 780} 4 4 re f\n" for i in range(1500)).encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    # pypdf adds a /Producer entry of its own
+    writer.metadata = None
+    if dirty:
+        writer.add_metadata({"/Author": "benchmark", "/Producer": "benchmark"})
+        writer._root_object[NameObject("/OpenAction")] = DictionaryObject({
+            NameObject("/S"): NameObject("/JavaScript"),
+            NameObject("/JS"): TextStringObject("app.alert('hi');"),
+        })
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def full_rewrite(input_path: str, output_path: str):
+    with open(input_path, "rb") as f:
+        reader = PdfReader(io.BytesIO(f.read()))
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    writer.metadata = None
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'size':>9} {'fast path':>10} {'sanitize':>10} {'old rewrite':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "out.pdf")
+        for pages in args.pages:
+            clean = os.path.join(directory, f"clean-{pages}.pdf")
+            dirty = os.path.join(directory, f"dirty-{pages}.pdf")
+            make_pdf(clean, pages, dirty=False)
+            make_pdf(dirty, pages, dirty=True)
+
+            assert sanitize_pdf_file(clean, output) is None, "clean document was rewritten"
+            fast = timed(sanitize_pdf_file, clean, output)
+            rewrite = timed(sanitize_pdf_file, dirty, output)
+            old = timed(full_rewrite, clean, output)
+            print(f"{pages:>6} {os.path.getsize(dirty) / 1024:>7.0f}KB {fast * 1000:>8.1f}ms "
+                  f"{rewrite * 1000:>8.1f}ms {old * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
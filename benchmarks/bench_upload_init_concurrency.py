@@ -0,0 +1,187 @@
+"""
+Latency of concurrent /upload/init calls, SDK calls inline vs on the storage thread pool.
+
+Drives the ASGI app in process with MongoDB and MinIO replaced by fakes
+that sleep for a configurable round trip. Each run fires --requests
+calls at once across --buckets cold buckets (the first call per bucket
+creates it in MinIO), with --multipart of them starting a multipart
+upload. Two paths are compared:
+
+- inline: every MinIO SDK call runs on the event loop, as StorageService
+  did before it got its own executor
+- pool: the current StorageService, which offloads each call to its
+  bounded thread pool (MINIO_MAX_WORKERS)
+
+and p50/p99 request latency is printed for each.
+
+    python benchmarks/bench_upload_init_concurrency.py --requests 500 --minio-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings are required at import time; nothing here connects to them
+for name in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET",
+             "MONGO_URI", "MONGO_DB_NAME", "ADMIN_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+
+from bson import ObjectId  # noqa: E402
+
+from app.api.routes import bucket_cache  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.core.security import get_current_project  # noqa: E402
+from app.models.project import Project  # noqa: E402
+from app.services.storage import StorageService, storage_service  # noqa: E402
+from main import app  # noqa: E402
+
+
+class FakeMinio:
+    """The SDK calls /upload/init can make, each costing one blocking round trip"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.buckets = set()
+
+    def _round_trip(self):
+        time.sleep(self.latency)
+
+    def bucket_exists(self, bucket_name):
+        self._round_trip()
+        return bucket_name in self.buckets
+
+    def make_bucket(self, bucket_name):
+        self._round_trip()
+        self.buckets.add(bucket_name)
+
+    def set_bucket_policy(self, bucket_name, policy):
+        self._round_trip()
+
+    def set_bucket_notification(self, bucket_name, config):
+        self._round_trip()
+
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        self._round_trip()
+        return str(ObjectId())
+
+
+class FakeCollection:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.docs = {}
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        await asyncio.sleep(self.latency)
+        key = json.dumps(query, sort_keys=True, default=str)
+        if key not in self.docs and upsert:
+            self.docs[key] = {"_id": ObjectId(), **query, **update.get("$setOnInsert", {})}
+        return self.docs.get(key)
+
+    async def find_one(self, query, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.docs.get(json.dumps(query, sort_keys=True, default=str))
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(self.latency)
+
+    async def update_one(self, query, update, **kwargs):
+        await asyncio.sleep(self.latency)
+
+    async def delete_one(self, query):
+        await asyncio.sleep(self.latency)
+
+
+class FakeDatabase:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.collections = {}
+
+    def __getattr__(self, name):
+        return self.collections.setdefault(name, FakeCollection(self.latency))
+
+
+async def _inline_run(func, *args, **kwargs):
+    """StorageService._run before the executor: the call blocks the event loop"""
+    return func(*args, **kwargs)
+
+
+async def call(body: dict) -> float:
+    """POST /upload/init straight through the ASGI app; returns the latency"""
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/upload/init", "raw_path": b"/upload/init",
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    if status != 200:
+        raise RuntimeError(f"/upload/init returned {status}")
+    return elapsed
+
+
+async def run(args, inline: bool) -> list[float]:
+    fake_db = FakeDatabase(args.db_latency)
+    storage_service.client = FakeMinio(args.minio_latency)
+    storage_service._run = _inline_run if inline else StorageService._run.__get__(storage_service)
+    bucket_cache.clear()
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    bodies = [
+        {
+            "filename": f"file-{i}.jpg", "file_type": "image/jpeg", "file_size": 64 * 1024 * 1024,
+            "bucket": f"bench-{i % args.buckets}", "multipart": i < args.multipart,
+        }
+        for i in range(args.requests)
+    ]
+    return await asyncio.gather(*(call(body) for body in bodies))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--buckets", type=int, default=20, help="distinct cold buckets the calls spread over")
+    parser.add_argument("--multipart", type=int, default=100, help="calls that start a multipart upload")
+    parser.add_argument("--minio-latency", type=float, default=0.02, help="seconds per MinIO round trip")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per MongoDB round trip")
+    args = parser.parse_args()
+
+    project = Project(_id=str(ObjectId()), name="bench", api_key="bench")
+    app.dependency_overrides[get_current_project] = lambda: project
+
+    print(f"{args.requests} concurrent calls, {args.buckets} new buckets, {args.multipart} multipart, "
+          f"MinIO {args.minio_latency * 1000:.0f}ms, MongoDB {args.db_latency * 1000:.0f}ms per round trip")
+    for label, inline in (("inline", True), ("pool", False)):
+        latencies = asyncio.run(run(args, inline))
+        print(f"{label:>7}: p50 {percentile(latencies, 50) * 1000:8.1f}ms  "
+              f"p99 {percentile(latencies, 99) * 1000:8.1f}ms  max {max(latencies) * 1000:8.1f}ms")
+    storage_service.close()
+
+
+if __name__ == "__main__":
+    main()
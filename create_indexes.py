@@ -1,43 +1,25 @@
 """
-Script to create database indexes for optimal performance.
-Run this once to improve query speed.
+Reconcile the database indexes with the registry in app/services/indexes.py.
+
+The API does this on startup (INDEX_RECONCILE_ON_STARTUP); run this script
+to build them ahead of a deploy, or to check a database for drift.
+Exits non-zero when an index could not be built or a hot query scans the
+collection or sorts in memory.
 """
 import asyncio
+import sys
 from app.core.database import db
+from app.core.log import configure_logging
+from app.services.indexes import reconcile_indexes
 
-async def create_indexes():
-    print("Creating database indexes for performance optimization...")
-    
-    # Connect to DB
+async def create_indexes() -> dict:
     db.connect()
-    
     try:
-        # Index on buckets.project_id for faster lookups
-        await db.db.buckets.create_index("project_id")
-        print("✅ Created index on buckets.project_id")
-        
-        # Index on files.project_id for faster aggregations
-        await db.db.files.create_index("project_id")
-        print("✅ Created index on files.project_id")
-        
-        # Index on projects.api_key for faster authentication
-        await db.db.projects.create_index("api_key", unique=True)
-        print("✅ Created unique index on projects.api_key")
-        
-        # Index on projects.name for faster duplicate checks
-        await db.db.projects.create_index("name", unique=True)
-        print("✅ Created unique index on projects.name")
-        
-        # Compound index on files for better aggregation performance
-        await db.db.files.create_index([("project_id", 1), ("size", 1)])
-        print("✅ Created compound index on files (project_id, size)")
-        
-        print("\n✨ All indexes created successfully!")
-        
-    except Exception as e:
-        print(f"❌ Error creating indexes: {str(e)}")
+        return await reconcile_indexes(db.db, explain=True)
     finally:
         db.close()
 
 if __name__ == "__main__":
-    asyncio.run(create_indexes())
+    configure_logging()
+    report = asyncio.run(create_indexes())
+    sys.exit(1 if report["failed"] or report["collscans"] or report["sorts"] else 0)
@@ -1,24 +1,60 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.routes import router as api_router
 from app.api.admin import router as admin_router
 from app.api.buckets import router as buckets_router
+from app.api.images import router as images_router
+from app.api.events import router as events_router
+from app.core.config import settings
 from app.core.database import db
+from app.core.log import configure_logging
+from app.core.metrics import EVENT_BACKLOG, QUEUE_DEPTH, MetricsMiddleware
+from app.services.storage import storage_service
+from app.services.janitor import run_janitor
+from app.services.events import run_event_applier
+from app.services.indexes import reconcile_indexes
+from app.services.images import shutdown_pool
+from app.services.queue import QUEUED, RUNNING
+from app.services.usage import baseline_usage
+from app.services.listing import backfill_content_family
+import asyncio
+
+configure_logging()
 
 app = FastAPI(title="MinIO File Backend")
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+background_jobs = []
 
 @app.on_event("startup")
 async def on_startup():
     db.connect()
+    await db.warm_up()
+    if settings.INDEX_RECONCILE_ON_STARTUP:
+        # Builds run server-side; startup doesn't wait for them
+        background_jobs.append(asyncio.create_task(reconcile_indexes(db.db)))
+    background_jobs.append(asyncio.create_task(run_janitor(db.db)))
+    background_jobs.append(asyncio.create_task(baseline_usage(db.db)))
+    background_jobs.append(asyncio.create_task(backfill_content_family(db.db)))
+    if settings.MINIO_WEBHOOK_TOKEN:
+        background_jobs.append(asyncio.create_task(run_event_applier(db.db)))
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    for job in background_jobs:
+        job.cancel()
     db.close()
+    storage_service.close()
+    shutdown_pool()
 
 app.include_router(api_router)
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 app.include_router(buckets_router, tags=["Buckets"])
+app.include_router(images_router, tags=["Images"])
+app.include_router(events_router, tags=["Events"])
 
 app.mount("/dashboard", StaticFiles(directory="app/dashboard", html=True), name="dashboard")
 
@@ -34,7 +70,18 @@ async def test():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    # Queue gauges are read from MongoDB at scrape time
+    if settings.JOB_QUEUE_BACKEND == "mongo":
+        for status in (QUEUED, RUNNING):
+            QUEUE_DEPTH.labels(status).set(await db.db.jobs.count_documents({"status": status}))
+    if settings.MINIO_WEBHOOK_TOKEN:
+        EVENT_BACKLOG.set(await db.db.object_events.estimated_document_count())
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
-    from fastapi import Response
     return Response(status_code=204)
@@ -0,0 +1,155 @@
+"""UpdateBatcher against a fake collection."""
+import time
+
+from pymongo.errors import AutoReconnect
+
+from app.services.batching import UpdateBatcher
+
+
+class FakeCollection:
+    """Records bulk_write calls; the first `failures` calls raise AutoReconnect"""
+
+    name = "files"
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.writes = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection refused")
+        assert not ordered
+        self.writes.append([(op._filter, op._doc["$set"]) for op in ops])
+
+    @property
+    def written(self) -> dict:
+        """Fields last written per filtered _id"""
+        result = {}
+        for batch in self.writes:
+            for query, fields in batch:
+                result.setdefault(query["_id"], {}).update(fields)
+        return result
+
+
+def test_updates_to_one_key_are_merged():
+    collection = FakeCollection()
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    for percent in range(50):
+        batcher.set("a", {"_id": "a"}, {"status": "transcoding", "progress": percent})
+    batcher.set("a", {"_id": "a"}, {"status": "transcoded"})
+    batcher.set("b", {"_id": "b"}, {"status": "clean"})
+    assert collection.calls == 0
+
+    assert batcher.flush()
+    assert collection.writes == [[
+        ({"_id": "a"}, {"status": "transcoded", "progress": 49}),
+        ({"_id": "b"}, {"status": "clean"}),
+    ]]
+    batcher.close()
+
+
+def test_max_ops_flushes():
+    collection = FakeCollection()
+    batcher = UpdateBatcher(collection, max_ops=3, interval=60)
+    for key in range(7):
+        batcher.set(key, {"_id": key}, {"status": "clean"})
+    assert [len(batch) for batch in collection.writes] == [3, 3]
+    batcher.close()
+    assert len(collection.written) == 7
+
+
+def test_interval_flushes():
+    collection = FakeCollection()
+    batcher = UpdateBatcher(collection, max_ops=100, interval=0.05)
+    batcher.set("a", {"_id": "a"}, {"status": "clean"})
+    deadline = time.monotonic() + 2
+    while not collection.writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert collection.written == {"a": {"status": "clean"}}
+    batcher.close()
+
+
+def test_flush_by_key():
+    collection = FakeCollection()
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    assert batcher.flush("a")
+    assert collection.calls == 0
+
+    batcher.set("a", {"_id": "a"}, {"status": "optimized"})
+    batcher.set("b", {"_id": "b"}, {"status": "clean"})
+    assert batcher.flush("a")
+    # Whatever is pending goes in the same write
+    assert collection.written == {"a": {"status": "optimized"}, "b": {"status": "clean"}}
+    batcher.close()
+
+
+def test_failed_flush_requeues_under_newer_fields():
+    collection = FakeCollection(failures=1)
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    batcher.set("a", {"_id": "a"}, {"status": "transcoding", "progress": 10})
+    assert not batcher.flush()
+    assert collection.writes == []
+
+    batcher.set("a", {"_id": "a"}, {"progress": 20})
+    assert batcher.flush()
+    assert collection.written == {"a": {"status": "transcoding", "progress": 20}}
+    batcher.close()
+
+
+def test_close_retries_failed_flushes():
+    collection = FakeCollection(failures=2)
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    batcher.set("a", {"_id": "a"}, {"status": "clean"})
+    batcher.close(attempts=3, backoff=0)
+    assert collection.calls == 3
+    assert collection.written == {"a": {"status": "clean"}}
+
+
+def test_close_gives_up_after_its_attempts():
+    collection = FakeCollection(failures=10)
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    batcher.set("a", {"_id": "a"}, {"status": "clean"})
+    batcher.close(attempts=2, backoff=0)
+    assert collection.calls == 2
+    assert collection.writes == []
+
+
+def test_set_after_close_writes_through():
+    collection = FakeCollection()
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60)
+    batcher.close()
+    batcher.set("a", {"_id": "a"}, {"status": "clean"})
+    assert collection.written == {"a": {"status": "clean"}}
+
+
+def test_acks_are_released_together_once_written():
+    collection = FakeCollection(failures=1)
+    settled = []
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60, on_flush=settled.append)
+    batcher.set("a", {"_id": "a"}, {"status": "optimized"})
+    batcher.ack("job-a")
+    batcher.set("b", {"_id": "b"}, {"status": "sanitized"})
+    batcher.ack("job-b")
+
+    # Held back while their updates are unwritten
+    assert not batcher.flush()
+    assert settled == []
+
+    assert batcher.flush()
+    assert collection.written == {"a": {"status": "optimized"}, "b": {"status": "sanitized"}}
+    assert settled == [["job-a", "job-b"]]
+    batcher.close()
+
+
+def test_acks_without_pending_updates_wait_for_the_next_flush():
+    collection = FakeCollection()
+    settled = []
+    batcher = UpdateBatcher(collection, max_ops=100, interval=60, on_flush=settled.append)
+    batcher.ack("job")
+    assert settled == []
+    batcher.close()
+    assert collection.calls == 0
+    assert settled == [["job"]]
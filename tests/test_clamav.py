@@ -0,0 +1,152 @@
+"""ClamdPool and INSTREAM against an in-process fake clamd."""
+import io
+import socket
+import struct
+import threading
+
+import pytest
+
+from app.services.clamav import ClamdError, ClamdPool, ClamdStreamTooLarge, ClamdUnavailable
+
+EICAR = b"X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*"
+
+
+class FakeClamd:
+    """Speaks enough of the clamd session protocol: IDSESSION, INSTREAM, END"""
+
+    def __init__(self, reply=None):
+        # reply(data) -> result; by default FOUND for EICAR, OK otherwise
+        self.reply = reply or (lambda data: "Eicar-Signature FOUND" if EICAR in data else "OK")
+        self.connections = 0
+        self.scanned = []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._session, args=(sock,), daemon=True).start()
+
+    @staticmethod
+    def _read_exact(f, n: int) -> bytes:
+        data = f.read(n)
+        if len(data) < n:
+            raise EOFError
+        return data
+
+    def _read_command(self, f) -> bytes:
+        command = b""
+        while not command.endswith(b"\0"):
+            command += self._read_exact(f, 1)
+        return command[:-1]
+
+    def _session(self, sock):
+        f = sock.makefile("rb")
+        request_id = 0
+        try:
+            assert self._read_command(f) == b"zIDSESSION"
+            while True:
+                command = self._read_command(f)
+                if command == b"zEND":
+                    return
+                assert command == b"zINSTREAM"
+                request_id += 1
+                data = b""
+                while True:
+                    (length,) = struct.unpack("!L", self._read_exact(f, 4))
+                    if not length:
+                        break
+                    data += self._read_exact(f, length)
+                self.scanned.append(data)
+                sock.sendall(f"{request_id}: stream: {self.reply(data)}\0".encode())
+        except EOFError:
+            pass
+        finally:
+            sock.close()
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def clamd():
+    server = FakeClamd()
+    yield server
+    server.close()
+
+
+def test_clean_stream_is_ok(clamd):
+    pool = ClamdPool("127.0.0.1", clamd.port, chunk_size=7)
+    with pool.connection() as conn:
+        assert conn.instream(io.BytesIO(b"hello, world" * 10), pool.chunk_size) == ("OK", None)
+    # Sent in 7-byte chunks, reassembled in full
+    assert clamd.scanned == [b"hello, world" * 10]
+    pool.close()
+
+
+def test_infected_stream_reports_signature(clamd):
+    pool = ClamdPool("127.0.0.1", clamd.port)
+    with pool.connection() as conn:
+        assert conn.instream(io.BytesIO(EICAR), pool.chunk_size) == ("FOUND", "Eicar-Signature")
+    pool.close()
+
+
+def test_sessions_are_reused(clamd):
+    pool = ClamdPool("127.0.0.1", clamd.port)
+    for _ in range(3):
+        with pool.connection() as conn:
+            assert conn.instream(io.BytesIO(b"data"), pool.chunk_size) == ("OK", None)
+    assert clamd.connections == 1
+    assert len(clamd.scanned) == 3
+    pool.close()
+
+
+def test_idle_sessions_are_not_reused(clamd):
+    pool = ClamdPool("127.0.0.1", clamd.port, idle_timeout=0)
+    for _ in range(2):
+        with pool.connection() as conn:
+            conn.instream(io.BytesIO(b"data"), pool.chunk_size)
+    assert clamd.connections == 2
+    pool.close()
+
+
+def test_error_reply_raises_and_drops_the_session():
+    server = FakeClamd(reply=lambda data: "INSTREAM size limit exceeded. ERROR" if len(data) > 10 else "OK")
+    pool = ClamdPool("127.0.0.1", server.port)
+    with pytest.raises(ClamdError):
+        with pool.connection() as conn:
+            conn.instream(io.BytesIO(b"x" * 11), pool.chunk_size)
+    with pool.connection() as conn:
+        assert conn.instream(io.BytesIO(b"x"), pool.chunk_size) == ("OK", None)
+    assert server.connections == 2
+    pool.close()
+    server.close()
+
+
+def test_size_limit_reply_is_too_large():
+    server = FakeClamd(reply=lambda data: "INSTREAM size limit exceeded. ERROR" if len(data) > 10 else "Can't allocate memory ERROR")
+    pool = ClamdPool("127.0.0.1", server.port)
+    with pytest.raises(ClamdStreamTooLarge):
+        with pool.connection() as conn:
+            conn.instream(io.BytesIO(b"x" * 11), pool.chunk_size)
+    # Other errors are not mistaken for the size limit
+    with pytest.raises(ClamdError) as excinfo:
+        with pool.connection() as conn:
+            conn.instream(io.BytesIO(b"x"), pool.chunk_size)
+    assert not isinstance(excinfo.value, ClamdStreamTooLarge)
+    pool.close()
+    server.close()
+
+
+def test_unreachable_clamd_raises_unavailable():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        port = s.getsockname()[1]
+    pool = ClamdPool("127.0.0.1", port, connect_timeout=1)
+    with pytest.raises(ClamdUnavailable):
+        with pool.connection():
+            pass
@@ -0,0 +1,94 @@
+"""apply_object_events against fake collections."""
+import asyncio
+import os
+
+for name in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET",
+             "MONGO_URI", "MONGO_DB_NAME", "ADMIN_SECRET"):
+    os.environ.setdefault(name, "test")
+
+from bson import ObjectId  # noqa: E402
+from pymongo.errors import AutoReconnect  # noqa: E402
+
+from app.services import events  # noqa: E402
+
+PROJECT_ID = str(ObjectId())
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = docs or []
+        self.deleted = []
+        self.writes = []
+        self.fail_for = None
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self.docs)
+
+    async def update_one(self, query, update):
+        pass
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+
+    async def bulk_write(self, ops, ordered=True):
+        bucket_names = {op._doc["bucket_name"] for op in ops}
+        if self.fail_for in bucket_names:
+            raise AutoReconnect("connection reset")
+        self.writes.append(ops)
+
+
+class FakeDatabase:
+    def __init__(self, buckets):
+        self.buckets = FakeCollection(buckets)
+        self.files = FakeCollection()
+        self.blobs = FakeCollection()
+        self.projects = FakeCollection()
+        self.object_events = FakeCollection()
+
+
+def _event(physical_name: str, key: str) -> dict:
+    return {"bucket": physical_name, "key": key, "event": events.CREATED, "size": 10, "content_type": "application/pdf"}
+
+
+def test_failing_bucket_keeps_the_jobs_of_earlier_buckets(monkeypatch):
+    db = FakeDatabase([
+        {"_id": ObjectId(), "name": name, "physical_name": f"{PROJECT_ID}-{name}", "project_id": PROJECT_ID}
+        for name in ("first", "second")
+    ])
+    db.files.fail_for = "second"
+    dispatched = []
+
+    async def claim(db, lease):
+        return [_event(f"{PROJECT_ID}-first", "a.txt"), _event(f"{PROJECT_ID}-second", "b.txt")]
+
+    async def dispatch(db, jobs):
+        dispatched.extend(jobs)
+
+    monkeypatch.setattr(events, "_claim", claim)
+    monkeypatch.setattr(events, "_dispatch", dispatch)
+
+    assert asyncio.run(events.apply_object_events(db)) == 2
+
+    # The first bucket's insert went through and its job was queued
+    assert len(db.files.writes) == 1
+    assert [kwargs["object_key"] for _, kwargs in dispatched] == ["a.txt"]
+    # The second bucket's events are left leased for a retry
+    (deleted,) = db.object_events.deleted
+    assert deleted["bucket"] == {"$nin": [f"{PROJECT_ID}-second"]}
@@ -0,0 +1,35 @@
+"""Listing filters and the hot queries that check their indexes."""
+import os
+
+for name in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET",
+             "MONGO_URI", "MONGO_DB_NAME", "ADMIN_SECRET"):
+    os.environ.setdefault(name, "test")
+
+import pytest  # noqa: E402
+
+from app.services.indexes import HOT_QUERIES  # noqa: E402
+from app.services.listing import INDEXED_FILTERS, listing_query  # noqa: E402
+
+FIELDS = {"bucket": "bucket_name", "status": "status", "content_type": "content_family", "prefix": "object_key"}
+
+
+def test_type_family_uses_content_family():
+    assert listing_query("p", content_type="image/") == {"project_id": "p", "content_family": "image"}
+    assert listing_query("p", content_type="image/png") == {
+        "project_id": "p", "content_family": "image", "content_type": "image/png"
+    }
+
+
+def test_combinations_without_an_index_are_rejected():
+    with pytest.raises(ValueError):
+        listing_query("p", bucket="b", status="ready", content_type="image/")
+    with pytest.raises(ValueError):
+        listing_query("p", status="ready", prefix="uploads/")
+
+
+def test_every_accepted_combination_is_explained():
+    explained = {
+        frozenset(name for name, field in FIELDS.items() if field in query)
+        for label, collection, query, sort in HOT_QUERIES if label.startswith("list files")
+    }
+    assert explained == INDEXED_FILTERS